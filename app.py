@@ -1,26 +1,83 @@
 import os
-import json
-import uvicorn
-import requests
 import pandas as pd
-import threading
 import streamlit as st
-from integrations.gsheet_loader import GoogleSheetLoader 
-from src.preprocessing2 import TicketProcessor
-from src.classification_tagging import TicketClassifier
-from src.test_request3 import RecommendationClient
-from src.gap_analysis import RecommendationAnalyzer
-from integrations.slack_alerts import DailyAlertScheduler
+
+# Page-specific modules (Google Sheets, Groq, APScheduler, the recommendation
+# client, ...) are imported inside the page that uses them, so the dashboard
+# starts without loading dependencies for pages that are not open.
 
 
 # CONFIG
-API_URL = "http://127.0.0.1:8000/recommend"
-LOG_PATH = "logs/recommendation_results_tickets5.csv"
+# Recommendations run in-process unless a remote API URL is configured
+API_URL = os.getenv("RECOMMENDATION_API_URL")
+MODEL_DIR = os.getenv("MODEL_DIR", "models")
+LOG_PATH = "logs/recommendation_results_tickets5.parquet"
 OUTPUT_DIR = "logs/"
+COVERAGE_REPORT_PATH = "logs/coverage_report5.parquet"
+ALERT_LOG_PATH = "logs/alerts5.log"
+SLACK_WEBHOOK_URL = os.getenv("SLACK_WEBHOOK_URL")
 
 st.set_page_config(page_title="Smart Support AI Dashboard", layout="wide")
 st.title("Smart Support AI Dashboard")
 
+
+# CACHED RESOURCES
+# Shared across reruns and sessions of this Streamlit process, so page
+# interactions don't rebuild clients or start duplicate schedulers.
+
+@st.cache_resource(show_spinner=False)
+def get_classifier():
+    from src.classification_tagging import TicketClassifier
+    return TicketClassifier()
+
+
+@st.cache_resource(show_spinner=False)
+def get_recommendation_client(api_url):
+    from src.test_request3 import RecommendationClient
+    return RecommendationClient(api_url=api_url)
+
+
+@st.cache_resource(show_spinner="Loading recommendation model and index...")
+def get_recommendation_engine(model_dir):
+    # Shared RecommendationAPI engine used directly, without an HTTP round-trip
+    from src.recommend_api import RecommendationAPI
+    return RecommendationAPI(model_dir=model_dir, log_dir="logs", top_k=3)
+
+
+@st.cache_resource(show_spinner=False)
+def get_alert_scheduler(slack_webhook_url, coverage_report_path, alert_log_path):
+    # Use BackgroundScheduler so Streamlit doesn’t freeze
+    from apscheduler.schedulers.background import BackgroundScheduler
+    from integrations.slack_alerts import DailyAlertScheduler
+
+    return DailyAlertScheduler(
+        slack_webhook_url=slack_webhook_url,
+        coverage_report_path=coverage_report_path,
+        alert_log_path=alert_log_path,
+        scheduler=BackgroundScheduler(),
+    )
+
+
+@st.cache_data(show_spinner=False)
+def load_report(path, modified_at):
+    # modified_at is part of the cache key, so a rewritten report is reloaded
+    from src.storage import read_table
+    return read_table(path)
+
+
+def read_report(path):
+    return load_report(path, os.path.getmtime(path))
+
+
+def clear_cached_resources():
+    # Stop a running scheduler before dropping it, so no job thread is leaked
+    if SLACK_WEBHOOK_URL:
+        alert_scheduler = get_alert_scheduler(SLACK_WEBHOOK_URL, COVERAGE_REPORT_PATH, ALERT_LOG_PATH)
+        if alert_scheduler.scheduler.running:
+            alert_scheduler.scheduler.shutdown(wait=False)
+    st.cache_resource.clear()
+    st.cache_data.clear()
+
 # SESSION STATE INIT
 
 if "gsheet_data" not in st.session_state:
@@ -62,6 +119,10 @@ page = st.sidebar.radio(
     ]
 )
 
+if st.sidebar.button("♻️ Reload cached resources"):
+    clear_cached_resources()
+    st.sidebar.success("Cached clients, scheduler and reports cleared.")
+
 
 # TAB 1: Load Tickets from Google Sheet
 if page == "📥 Load Tickets from Google Sheet":
@@ -72,14 +133,24 @@ if page == "📥 Load Tickets from Google Sheet":
     sheet_name = st.text_input("Google Sheet Name", "tickets1")
     worksheet_name = st.text_input("Worksheet Name", "Sheet1")
     creds_path = st.text_input("Credentials File Path", "credentials/service_account.json")
+    incremental = st.checkbox(
+        "Only fetch new rows since the last load",
+        value=True,
+        help="New rows are appended to data/raw/tickets_store and only they are saved to tickets6.csv for preprocessing."
+    )
     
     submit_button = st.button("Load Data")
     
     if submit_button:
+        from integrations.gsheet_loader import GoogleSheetLoader
+
         try:
             google_sheet_loader = GoogleSheetLoader(sheet_name, worksheet_name, creds_path)
-            st.session_state.gsheet_data = google_sheet_loader.load_data()
-            st.success("Tickets Loaded Successfully!")
+            if incremental:
+                st.session_state.gsheet_data = google_sheet_loader.load_incremental()
+            else:
+                st.session_state.gsheet_data = google_sheet_loader.load_data()
+            st.success(f"Tickets Loaded Successfully! ({len(st.session_state.gsheet_data)} rows)")
 
             if not st.session_state.gsheet_data.empty:
                 st.write("### Loaded Tickets Preview")
@@ -101,6 +172,8 @@ if page == "📥 Load Tickets from Google Sheet":
                     file_name="loaded_tickets.csv",
                     mime="text/csv"
                 )
+            elif incremental:
+                st.info("No new tickets since the last load.")
             else:
                 st.warning("No data found in the Google Sheet.")
         except Exception as e:
@@ -112,6 +185,8 @@ if page == "📥 Load Tickets from Google Sheet":
 # TAB 2: Ticket Preprocessing
 if page == "🧹 Ticket Preprocessing":
     st.header("🧹 Ticket Preprocessing")
+    from src.preprocessing2 import TicketProcessor
+    from src.storage import read_table
     
     # File upload or path input for raw ticket CSV
     file_option = st.radio("Input Option:", ["CSV Upload", "Use Default File"])
@@ -122,7 +197,7 @@ if page == "🧹 Ticket Preprocessing":
         if uploaded_file:
             uploaded_filename = uploaded_file.name
             base_filename = uploaded_filename.split('.')[0]
-            preprocessed_filename = f"preprocessed_{base_filename}.csv"
+            preprocessed_filename = f"preprocessed_{base_filename}.parquet"
 
             df = pd.read_csv(uploaded_file)
             st.dataframe(df.head())  # Show sample data
@@ -135,21 +210,21 @@ if page == "🧹 Ticket Preprocessing":
                     st.success(f"Preprocessing completed! Saved to data/processed/{preprocessed_filename}")
 
                 # Optionally, show and provide a download for the processed CSV
-                processed_df = pd.read_csv(f"data/processed/{preprocessed_filename}")
+                processed_df = read_table(f"data/processed/{preprocessed_filename}")
                 st.dataframe(processed_df.head())
                 st.download_button("Download Processed CSV", processed_df.to_csv(index=False), "processed_tickets.csv", "text/csv")
 
     else:  # Use default file (hardcoded path)
         st.subheader("Using Default Tickets File")
-        processor = TicketProcessor("data/raw/tickets6.csv", "data/processed/preprocessed_tickets6.csv")
-        
         if st.button("Preprocess and Save Default File"):
             with st.spinner("Preprocessing default tickets..."):
+                # Read the raw file only when preprocessing is requested, not on every rerun
+                processor = TicketProcessor("data/raw/tickets6.csv", "data/processed/preprocessed_tickets6.parquet")
                 processor.process_and_save()
-                st.success(f"Preprocessing completed! Processed file saved in data/processed/preprocessed_tickets6.csv")
+                st.success(f"Preprocessing completed! Processed file saved in data/processed/preprocessed_tickets6.parquet")
 
             # Show and download the processed data
-            processed_df = pd.read_csv("data/processed/preprocessed_tickets6.csv")
+            processed_df = read_table("data/processed/preprocessed_tickets6.parquet")
             st.dataframe(processed_df.head())
             st.download_button(
                 label="📥 Download Processed Tickets",
@@ -162,7 +237,8 @@ if page == "🧹 Ticket Preprocessing":
 # TAB 2: Ticket Classification
 if page == "🎫 Ticket Classification and Tagging":
     st.header("🎫 Ticket Classification and Tagging")
-    classifier = TicketClassifier()
+    from src.storage import write_table
+    classifier = get_classifier()
 
     classify_option = st.radio("Input Type:", ["Single Ticket", "CSV Upload"])
 
@@ -191,18 +267,17 @@ if page == "🎫 Ticket Classification and Tagging":
                     with st.spinner("Classifying all tickets..."):
                         ticket_id = df["ticket_id"].tolist()
                         tickets = df["clean_text"].tolist()
-                        classifier.classify_all(ticket_id, tickets)
+                        results = classifier.classify_all(ticket_id, tickets)
 
                         # Convert the results to a DataFrame
-                        classified_df = pd.DataFrame(classifier.results)
+                        classified_df = pd.DataFrame(results)
                         st.session_state.batch_classify_result = classified_df
 
-                        # Save the classified tickets as a CSV file
+                        # Save the classified tickets as a Parquet file
                         classified_data_dir = "data/processed"
-                        os.makedirs(classified_data_dir, exist_ok=True)
-                        tickets_file_path = os.path.join(classified_data_dir, "classified_tickets5.csv")
+                        tickets_file_path = os.path.join(classified_data_dir, "classified_tickets5.parquet")
 
-                        classified_df.to_csv(tickets_file_path, index=False)
+                        write_table(classified_df, tickets_file_path, schema="classified")
                         st.success(f"✅ Classified tickets saved to {tickets_file_path}")
 
                 if st.session_state.batch_classify_result is not None:
@@ -219,13 +294,24 @@ if page == "🎫 Ticket Classification and Tagging":
 # TAB 3: Recommendations
 if page == "📄 Ticket Recommendations":
     st.header("📄 Single Ticket Recommendation")
+    import requests
+    from src.storage import write_table
 
     with st.form("recommend_form"):
         ticket_id = st.text_input("Ticket ID", "T001")
         ticket_text = st.text_area("Ticket Text", "I was charged twice for my order.")
         submitted = st.form_submit_button("Get Recommendations ⚡")
 
-    if submitted:
+    if submitted and API_URL is None:
+        try:
+            engine = get_recommendation_engine(MODEL_DIR)
+            st.session_state.recommendation_result = engine.recommend(ticket_id, ticket_text)
+            st.success("✅ Recommendations received successfully!")
+        except FileNotFoundError as e:
+            st.error(f"⚠️ Model or index not found: {e}")
+            st.code("python -m src.build_index")
+
+    elif submitted:
         try:
             payload = {"ticket_id": ticket_id, "ticket_text": ticket_text}
             response = requests.post(API_URL, json=payload)
@@ -239,7 +325,7 @@ if page == "📄 Ticket Recommendations":
 
         except requests.exceptions.ConnectionError:
             st.error("⚠️ Could not connect to FastAPI server.")
-            st.code("uvicorn src.recommend_api:app --reload")
+            st.code("uvicorn src.recommend_api:create_app --factory --reload")
 
     if st.session_state.recommendation_result:
         st.subheader("Recommended Articles")
@@ -250,9 +336,6 @@ if page == "📄 Ticket Recommendations":
 
     st.header("📄 Multiple Tickets Recommendation")
 
-    api_url = os.getenv("RECOMMENDATION_API_URL", "http://127.0.0.1:8000/recommend")
-    client = RecommendationClient(api_url=api_url)
-
     uploaded_file = st.file_uploader(
         "Upload a CSV file containing tickets", type=["csv"], key="ticket_upload"
     )
@@ -266,19 +349,29 @@ if page == "📄 Ticket Recommendations":
         if st.button("Get Recommendations ⚡", key="recommend_button"):
             with st.spinner("Generating Recommendations..."):
                 tickets = df.to_dict(orient="records")
-                results = [client.send_ticket(ticket) for ticket in tickets]
+                if API_URL is None:
+                    # Embedded mode: batch encode + search over the whole upload
+                    results = get_recommendation_engine(MODEL_DIR).recommend_batch(tickets)
+                else:
+                    client = get_recommendation_client(API_URL)
+                    results = [None] * len(tickets)
+                    for i, result in client.iter_results(tickets):
+                        results[i] = result
                 results_df = pd.DataFrame(results)
+                if "error" in results_df.columns and results_df["error"].notna().any():
+                    failed = results_df[results_df["error"].notna()]
+                    st.warning(f"⚠️ {len(failed)} ticket(s) got no recommendations: "
+                               f"{failed['error'].iloc[0]}")
                 
-                os.makedirs("logs", exist_ok=True)
-                results_df.to_csv(f"logs/recommendation_results_tickets5.csv", index=False)
-                st.success(f"✅ Recommendations generated and saved to logs/recommendation_results_tickets5.csv")
+                write_table(results_df, LOG_PATH, schema="recommendations")
+                st.success(f"✅ Recommendations generated and saved to {LOG_PATH}")
                 
                 results_df["results"] = results_df["recommendations"]  # map your data here
                 
                 # Flatten and format recommendations for display (top 3 only)
                 def format_recommendations(recs):
                     if isinstance(recs, list):
-                        return ", ".join([r.get("title", str(r)) for r in recs[:3]])
+                        return ", ".join([r.get("article_title", str(r)) for r in recs[:3]])
                     return str(recs)
 
                 if "recommendations" in results_df.columns:
@@ -307,6 +400,8 @@ if page == "📊 Gap Analysis":
 
     if os.path.exists(LOG_PATH):
         if st.button("Run Coverage & Engagement Analysis", key="run_analysis"):
+            from src.gap_analysis import RecommendationAnalyzer
+
             analyzer = RecommendationAnalyzer(log_path=LOG_PATH, output_dir=OUTPUT_DIR)
             with st.spinner("Analyzing logs..."):
                 st.session_state.analysis_result = analyzer.run_full_analysis()
@@ -328,14 +423,13 @@ if page == "📊 Gap Analysis":
             st.subheader("Unused Articles (0 Impressions)")
             st.dataframe(results["unused"][["article", "impressions"]])
 
-            # Download report
-            with open(results["report_path"], "rb") as f:
-                st.download_button(
-                    label="📥 Download Coverage Report CSV",
-                    data=f,
-                    file_name=os.path.basename(results["report_path"]),
-                    mime="text/csv"
-                )
+            # Download report (stored as Parquet, offered as CSV)
+            st.download_button(
+                label="📥 Download Coverage Report CSV",
+                data=results["summary"].to_csv(index=False),
+                file_name=os.path.splitext(os.path.basename(results["report_path"]))[0] + ".csv",
+                mime="text/csv"
+            )
     else:
         st.info("📄 No logs found yet. Submit tickets first via the Recommendations tab.")
 
@@ -343,14 +437,6 @@ if page == "📊 Gap Analysis":
 
 
 # TAB 5: Slack Alerts 
-
-# CONFIG
-SLACK_WEBHOOK_URL = os.getenv("SLACK_WEBHOOK_URL")
-
-from apscheduler.schedulers.background import BackgroundScheduler
-from integrations.slack_alerts import DailyAlertScheduler  # Import your class
-import dotenv
-
 if page == "🔔 Slack Alerts":
     st.header("🔔 Slack Alerts - Daily Gap Analysis")
     st.markdown("Monitor article CTRs and automatically send alerts to Slack channels.")
@@ -359,16 +445,10 @@ if page == "🔔 Slack Alerts":
         st.error("❌ `SLACK_WEBHOOK_URL` is not set in your `.env` file. Please configure it before using this page.")
         st.stop()
 
-    # Initialize Scheduler 
-    alert_scheduler = DailyAlertScheduler(
-        slack_webhook_url=SLACK_WEBHOOK_URL,
-        coverage_report_path="logs/coverage_report5.csv",
-        alert_log_path="logs/alerts5.log"
-    )
+    from apscheduler.schedulers.base import STATE_PAUSED, STATE_RUNNING, STATE_STOPPED
 
-    # Use BackgroundScheduler so Streamlit doesn’t freeze
-    alert_scheduler.scheduler = BackgroundScheduler()
-    alert_scheduler.scheduler.add_job(alert_scheduler.daily_alert, "interval", hours=24)
+    # Initialize Scheduler (cached: one BackgroundScheduler per dashboard process)
+    alert_scheduler = get_alert_scheduler(SLACK_WEBHOOK_URL, COVERAGE_REPORT_PATH, ALERT_LOG_PATH)
 
     # UI Controls
     st.subheader("Alert Management")
@@ -383,16 +463,20 @@ if page == "🔔 Slack Alerts":
 
     with col2:
         if st.button("▶️ Start Scheduler"):
-            if not alert_scheduler.scheduler.running:
+            # The cached scheduler is paused, not shut down, on Stop: a shut down one can't be restarted
+            if alert_scheduler.scheduler.state == STATE_STOPPED:
                 alert_scheduler.scheduler.start()
                 st.success("🚀 Scheduler started — will run every 24 hours.")
+            elif alert_scheduler.scheduler.state == STATE_PAUSED:
+                alert_scheduler.scheduler.resume()
+                st.success("🚀 Scheduler resumed — will run every 24 hours.")
             else:
                 st.warning("⚠️ Scheduler is already running.")
 
     with col3:
         if st.button("⏹ Stop Scheduler"):
-            if alert_scheduler.scheduler.running:
-                alert_scheduler.scheduler.shutdown()
+            if alert_scheduler.scheduler.state == STATE_RUNNING:
+                alert_scheduler.scheduler.pause()
                 st.warning("🛑 Scheduler stopped.")
             else:
                 st.info("Scheduler is not currently running.")
@@ -410,7 +494,7 @@ if page == "🔔 Slack Alerts":
     # --- Preview Current Coverage Report ---
     if os.path.exists(alert_scheduler.coverage_report_path):
         st.markdown("### 📊 Current Coverage Report Preview")
-        df = pd.read_csv(alert_scheduler.coverage_report_path)
+        df = read_report(alert_scheduler.coverage_report_path)
         st.dataframe(df.head())
     else:
         st.info("No coverage report found. Please upload one above.")
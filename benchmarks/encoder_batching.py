@@ -0,0 +1,132 @@
+"""
+Throughput of length-bucketed batching vs. naive fixed-size batching.
+
+Encodes a synthetic mix of short tickets and multi-paragraph emails twice:
+in input order with a fixed batch size, and through BucketedEncoder. Both
+runs truncate at the same token budget, so the embeddings should agree;
+the report has texts/sec, padding ratio (padded / real tokens) and the
+cosine agreement between the two runs. SentenceTransformer already sorts
+texts by length within one encode call, so expect the largest gain on the
+ONNX backend and on inputs that arrive in many small calls.
+
+Usage (from the project root):
+    python -m benchmarks.encoder_batching --texts 2000 --encoder onnx --max-tokens 256
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import numpy as np
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from src.encoders import load_encoder, BucketedEncoder, padding_ratio
+from src.evaluation import cosine_agreement
+from benchmarks.run_benchmarks import TOPICS, _text, git_commit
+
+
+def generate_texts(num_texts, seed=42):
+    """Mostly short tickets, some paragraphs and a few long emails."""
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(num_texts):
+        topic = rng.choice(list(TOPICS))
+        draw = rng.random()
+        if draw < 0.6:
+            texts.append(_text(rng, topic, 5, 15))
+        elif draw < 0.9:
+            texts.append(_text(rng, topic, 30, 80))
+        else:
+            texts.append(_text(rng, topic, 150, 400))
+    return texts
+
+
+def timed(fn, repeat):
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def run(args):
+    texts = generate_texts(args.texts, seed=args.seed)
+    onnx_dir = args.onnx_dir or os.path.join("models", "onnx")
+    encoder = load_encoder(args.model_name, backend=args.encoder, onnx_dir=onnx_dir)
+    bucketed = BucketedEncoder(encoder, max_tokens=args.max_tokens, max_batch_tokens=args.max_batch_tokens)
+
+    lengths = bucketed.token_lengths(texts)
+    naive_batches = [np.arange(i, min(i + args.batch_size, len(texts))) for i in range(0, len(texts), args.batch_size)]
+
+    print(f"Encoding {len(texts)} texts ({int(lengths.sum())} tokens) with the {args.encoder} encoder...")
+    # Warm up both paths so one-off initialization isn't timed
+    encoder.encode(texts[:args.batch_size], batch_size=args.batch_size, convert_to_numpy=True)
+    bucketed.encode(texts[:args.batch_size])
+
+    naive, naive_s = timed(lambda: encoder.encode(texts, batch_size=args.batch_size, convert_to_numpy=True),
+                           args.repeat)
+    bucketed_embeds, bucketed_s = timed(lambda: bucketed.encode(texts), args.repeat)
+    cosines = cosine_agreement(np.asarray(naive, dtype=np.float32), np.asarray(bucketed_embeds, dtype=np.float32))
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "config": vars(args),
+        "tokens": {"total": int(lengths.sum()), "mean": float(lengths.mean()), "max": int(lengths.max())},
+        "naive": {
+            "seconds": naive_s,
+            "texts_per_s": len(texts) / naive_s,
+            "batches": len(naive_batches),
+            "padding_ratio": padding_ratio(lengths, naive_batches),
+        },
+        "bucketed": {
+            "seconds": bucketed_s,
+            "texts_per_s": len(texts) / bucketed_s,
+            "batches": len(bucketed.plan(lengths)),
+            "padding_ratio": padding_ratio(lengths, bucketed.plan(lengths)),
+        },
+        "speedup": naive_s / bucketed_s,
+        "cosine_mean": float(cosines.mean()),
+        "cosine_min": float(cosines.min()),
+    }
+    print(f"naive:    {results['naive']['texts_per_s']:.1f} texts/s, padding x{results['naive']['padding_ratio']:.2f}")
+    print(f"bucketed: {results['bucketed']['texts_per_s']:.1f} texts/s, "
+          f"padding x{results['bucketed']['padding_ratio']:.2f} (speedup {results['speedup']:.2f}x, "
+          f"min cosine {results['cosine_min']:.4f})")
+
+    output = args.output or os.path.join(
+        PROJECT_ROOT, "benchmarks", "results",
+        f"{time.strftime('%Y%m%d-%H%M%S')}_{results['commit'] or 'nogit'}_encoder_batching.json"
+    )
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2, default=str)
+    print(f"Benchmark results saved to: {output}")
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark length-bucketed vs. naive encoder batching.")
+    parser.add_argument("--texts", type=int, default=2000, help="Number of synthetic texts.")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--encoder", default="stub", choices=["stub", "torch", "onnx"],
+                        help="Encoder backend; 'stub' runs offline but shows no padding cost.")
+    parser.add_argument("--model-name", default="all-MiniLM-L6-v2")
+    parser.add_argument("--onnx-dir", default=None, help="Directory of the exported ONNX model.")
+    parser.add_argument("--batch-size", type=int, default=32, help="Batch size of the naive run.")
+    parser.add_argument("--max-tokens", type=int, default=256, help="Token budget texts are truncated to.")
+    parser.add_argument("--max-batch-tokens", type=int, default=4096, help="Padded tokens per bucketed batch.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per mode; the fastest is reported.")
+    parser.add_argument("--output", default=None, help="Path of the JSON results file.")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    run(parse_args())
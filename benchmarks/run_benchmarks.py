@@ -0,0 +1,268 @@
+"""
+Reproducible benchmarks for the retrieval and serving stack.
+
+Generates a synthetic knowledge base and ticket corpus, then measures:
+  - indexing throughput of KnowledgeBaseIndexer (per stage)
+  - in-process query encode and FAISS search latency
+  - end-to-end /recommend throughput and latency under concurrency
+
+Results are written as JSON (tagged with the git commit) so runs can be
+compared across commits.
+
+Usage (from the project root):
+    python -m benchmarks.run_benchmarks --articles 2000 --tickets 500 --encoder stub
+"""
+import os
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+import numpy as np
+import pandas as pd
+import requests
+from concurrent.futures import ThreadPoolExecutor
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from src.build_index import KnowledgeBaseIndexer
+
+
+TOPICS = {
+    "Billing": ["invoice", "charge", "payment", "refund", "card", "subscription", "receipt", "billing"],
+    "Technical": ["crash", "error", "update", "install", "timeout", "sync", "app", "loading"],
+    "Account": ["password", "login", "email", "verification", "profile", "locked", "reset", "account"],
+    "Delivery": ["order", "shipping", "tracking", "courier", "delayed", "address", "package", "delivery"],
+}
+FILLER = ["the", "my", "is", "not", "after", "please", "help", "with", "since", "yesterday", "and", "still"]
+
+
+def _text(rng, topic, min_words, max_words):
+    words = TOPICS[topic] * 2 + FILLER
+    text = " ".join(rng.choices(words, k=rng.randint(min_words, max_words)))
+    if rng.random() < 0.3:
+        text += f" SKU-{rng.randint(1000, 9999)}"
+    if rng.random() < 0.2:
+        text += f" ERR_{rng.choice(['TIMEOUT', 'AUTH', 'PAYMENT', 'SYNC'])}_{rng.randint(100, 999)}"
+    return text
+
+
+def generate_kb(num_articles, seed=42):
+    """Synthetic KB articles with title, body and category columns."""
+    rng = random.Random(seed)
+    rows = []
+    for i in range(num_articles):
+        topic = rng.choice(list(TOPICS))
+        rows.append({
+            "title": f"{topic} guide {i}: " + " ".join(rng.sample(TOPICS[topic], 3)),
+            "body": _text(rng, topic, 40, 200),
+            "category": topic,
+        })
+    return pd.DataFrame(rows)
+
+
+def generate_tickets(num_tickets, seed=7):
+    """Synthetic tickets with a mix of short and multi-paragraph texts."""
+    rng = random.Random(seed)
+    rows = []
+    for i in range(num_tickets):
+        topic = rng.choice(list(TOPICS))
+        max_words = 12 if rng.random() < 0.6 else 150
+        rows.append({"ticket_id": f"T{i:06d}", "ticket_text": _text(rng, topic, 5, max_words)})
+    return pd.DataFrame(rows)
+
+
+def percentiles(latencies_ms):
+    latencies_ms = np.asarray(latencies_ms, dtype=np.float64)
+    if latencies_ms.size == 0:
+        return {}
+    return {
+        "count": int(latencies_ms.size),
+        "mean_ms": float(latencies_ms.mean()),
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p95_ms": float(np.percentile(latencies_ms, 95)),
+        "p99_ms": float(np.percentile(latencies_ms, 99)),
+        "max_ms": float(latencies_ms.max()),
+    }
+
+
+def bench_indexing(args, kb_path):
+    indexer = KnowledgeBaseIndexer(
+        data_path=kb_path,
+        model_name=args.model_name,
+        output_dir="models",
+        encoder_backend=args.encoder,
+        storage=args.storage,
+        encode_workers=args.encode_workers,
+    )
+
+    stages = {}
+    for name, step in [
+        ("load_data", indexer.load_data),
+        ("load_model", indexer.load_model),
+        ("compute_embeddings", indexer.compute_embeddings),
+        ("build_index", indexer.build_index),
+        ("build_lexical_index", indexer.build_lexical_index),
+        ("save_index", indexer.save_index),
+    ]:
+        start = time.perf_counter()
+        step()
+        stages[name] = time.perf_counter() - start
+
+    encode_s = stages["compute_embeddings"]
+    return {
+        "stages_s": stages,
+        "total_s": sum(stages.values()),
+        "articles": len(indexer.articles),
+        "encode_articles_per_s": len(indexer.articles) / encode_s if encode_s else None,
+    }
+
+
+def bench_in_process(api, tickets, k):
+    texts = tickets["ticket_text"].tolist()
+    encode_ms, search_ms = [], []
+    for text in texts:
+        start = time.perf_counter()
+        query = api.encode_queries([text])
+        mid = time.perf_counter()
+        api.index.search(query, k)
+        end = time.perf_counter()
+        encode_ms.append((mid - start) * 1000)
+        search_ms.append((end - mid) * 1000)
+    return {"encode": percentiles(encode_ms), "search": percentiles(search_ms)}
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(app):
+    """Run the FastAPI app on a background uvicorn server."""
+    import uvicorn
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread, f"http://127.0.0.1:{port}/recommend"
+
+
+def bench_http(url, tickets, concurrency):
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+    session.mount("http://", adapter)
+    payloads = tickets.to_dict(orient="records")
+
+    def send(payload):
+        start = time.perf_counter()
+        response = session.post(url, json=payload, timeout=30)
+        return (time.perf_counter() - start) * 1000, response.status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(send, payloads))
+    elapsed = time.perf_counter() - start
+
+    latencies = [ms for ms, status in outcomes if status == 200]
+    return {
+        "concurrency": concurrency,
+        "requests": len(outcomes),
+        "errors": sum(1 for _, status in outcomes if status != 200),
+        "throughput_rps": len(outcomes) / elapsed if elapsed else None,
+        "latency": percentiles(latencies),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    if args.output:
+        args.output = os.path.abspath(args.output)
+    workdir = args.workdir or tempfile.mkdtemp(prefix="kb_bench_")
+    os.makedirs(os.path.join(workdir, "data", "raw"), exist_ok=True)
+    os.chdir(workdir)
+
+    kb_path = os.path.join("data", "raw", "bench_articles.csv")
+    generate_kb(args.articles, seed=args.seed).to_csv(kb_path, index=False)
+    tickets = generate_tickets(args.tickets, seed=args.seed + 1)
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "config": vars(args),
+    }
+
+    print("Benchmarking indexing...")
+    results["indexing"] = bench_indexing(args, kb_path)
+
+    from src.recommend_api import RecommendationAPI
+
+    api = RecommendationAPI(model_dir="models", log_dir="logs", top_k=args.top_k)
+
+    print("Benchmarking in-process encode/search...")
+    results["in_process"] = bench_in_process(api, tickets, args.top_k)
+
+    if not args.skip_http:
+        server = None
+        url = args.url
+        if url is None:
+            server, thread, url = start_server(api.get_app())
+        try:
+            results["http"] = []
+            for concurrency in args.concurrency:
+                print(f"Benchmarking /recommend at concurrency {concurrency}...")
+                results["http"].append(bench_http(url, tickets, concurrency))
+        finally:
+            if server is not None:
+                server.should_exit = True
+                thread.join(timeout=5)
+
+    output = args.output or os.path.join(
+        PROJECT_ROOT, "benchmarks", "results", f"{time.strftime('%Y%m%d-%H%M%S')}_{results['commit'] or 'nogit'}.json"
+    )
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2, default=str)
+    print(f"Benchmark results saved to: {output}")
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the retrieval and serving stack.")
+    parser.add_argument("--articles", type=int, default=2000, help="Synthetic KB size.")
+    parser.add_argument("--tickets", type=int, default=500, help="Synthetic ticket count.")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--encoder", default="stub", choices=["stub", "torch", "onnx"],
+                        help="Encoder backend; 'stub' runs fully offline.")
+    parser.add_argument("--model-name", default="all-MiniLM-L6-v2")
+    parser.add_argument("--storage", default="flat", choices=["flat", "sqfp16", "sq8"])
+    parser.add_argument("--encode-workers", type=int, default=1, help="Processes used to encode the KB.")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--url", default=None, help="Benchmark an already running /recommend endpoint.")
+    parser.add_argument("--skip-http", action="store_true")
+    parser.add_argument("--workdir", default=None, help="Directory for the synthetic data and index.")
+    parser.add_argument("--output", default=None, help="Path of the JSON results file.")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    run(parse_args())
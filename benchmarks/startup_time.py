@@ -0,0 +1,88 @@
+"""
+Import-time budget check for the API and the dashboard.
+
+Each target is imported in a fresh interpreter a few times; the best wall
+time is compared against its budget, and the modules it must NOT pull in at
+import time (model runtimes, API clients, schedulers) are checked. Exits
+non-zero if any budget or import rule is violated, so it can run in CI.
+
+Usage (from the project root):
+    python -m benchmarks.startup_time --repeat 5 --output startup.json
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# target module -> (budget in ms, modules that must not be imported)
+TARGETS = {
+    "src.recommend_api": (1500, ["torch", "sentence_transformers", "onnxruntime"]),
+    "src.build_index": (1500, ["torch", "sentence_transformers", "onnxruntime"]),
+    "src.gap_analysis": (1000, ["torch", "sentence_transformers", "faiss"]),
+    "app": (3000, ["torch", "sentence_transformers", "faiss", "groq", "gspread", "apscheduler"]),
+}
+
+PROBE = """
+import sys, time, json
+start = time.perf_counter()
+import {module}
+elapsed = (time.perf_counter() - start) * 1000
+print(json.dumps({{"ms": elapsed, "loaded": [m for m in {forbidden!r} if m in sys.modules]}}))
+"""
+
+
+def measure(module, forbidden, repeat):
+    runs = []
+    for _ in range(repeat):
+        out = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=module, forbidden=forbidden)],
+            cwd=PROJECT_ROOT, capture_output=True, text=True,
+        )
+        if out.returncode != 0:
+            return {"error": out.stderr.strip().splitlines()[-1] if out.stderr.strip() else "import failed"}
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return {"best_ms": min(r["ms"] for r in runs), "loaded_forbidden": runs[0]["loaded"]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check import-time budgets.")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiply all budgets (slow CI machines).")
+    parser.add_argument("--targets", nargs="*", default=list(TARGETS))
+    parser.add_argument("--output", default=None, help="Write results as JSON.")
+    args = parser.parse_args(argv)
+
+    results, failed = {}, False
+    for module in args.targets:
+        budget_ms, forbidden = TARGETS[module]
+        budget_ms *= args.scale
+        result = measure(module, forbidden, args.repeat)
+        result["budget_ms"] = budget_ms
+
+        if "error" in result:
+            status = "ERROR"
+        elif result["loaded_forbidden"]:
+            status = "FAIL (imports " + ", ".join(result["loaded_forbidden"]) + ")"
+        elif result["best_ms"] > budget_ms:
+            status = "FAIL (over budget)"
+        else:
+            status = "OK"
+        result["status"] = status
+        failed = failed or status != "OK"
+        results[module] = result
+
+        timing = f"{result['best_ms']:.0f} ms" if "best_ms" in result else result["error"]
+        print(f"{module:<20} {timing:>10} / {budget_ms:.0f} ms  {status}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,355 @@
+import os
+import re
+import json
+import time
+import argparse
+import requests
+import dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Load environment variables from .env file
+dotenv.load_dotenv()
+
+STOPWORDS = {
+    "the", "and", "for", "with", "that", "this", "have", "from", "your", "after",
+    "been", "not", "but", "are", "was", "can", "cant", "when", "what", "how",
+    "why", "please", "help", "still", "again", "into", "there", "they", "does",
+}
+
+
+def default_topic(event):
+    """
+    Topic of a query: the event's own "topic" field if present, else its
+    first two content words ("refund duplicate", "password reset", ...).
+    """
+    if event.get("topic"):
+        return str(event["topic"])
+    words = [w for w in re.findall(r"[a-z]+", str(event.get("query_text", "")).lower())
+             if len(w) > 2 and w not in STOPWORDS]
+    return " ".join(words[:2]) or "unknown"
+
+
+class WindowCounter:
+    """
+    Per-key counters in fixed time buckets, kept for horizon_s seconds.
+    Sums over any time range inside the horizon are cheap.
+    """
+
+    FIELDS = ("impressions", "clicks", "score_sum", "queries", "zero_hits")
+
+    def __init__(self, bucket_s=60, horizon_s=2 * 24 * 3600):
+        self.bucket_s = bucket_s
+        self.horizon_s = horizon_s
+        self.buckets = {}  # key -> {bucket_start: [impressions, clicks, score_sum, queries, zero_hits]}
+
+    def add(self, key, ts, **values):
+        start = int(ts // self.bucket_s * self.bucket_s)
+        bucket = self.buckets.setdefault(key, {}).setdefault(start, [0, 0, 0.0, 0, 0])
+        for i, field in enumerate(self.FIELDS):
+            bucket[i] += values.get(field, 0)
+
+    def totals(self, key, start, end):
+        sums = [0, 0, 0.0, 0, 0]
+        for bucket_start, values in self.buckets.get(key, {}).items():
+            if start <= bucket_start < end:
+                for i, value in enumerate(values):
+                    sums[i] += value
+        return dict(zip(self.FIELDS, sums))
+
+    def prune(self, now):
+        cutoff = now - self.horizon_s
+        for key in list(self.buckets):
+            kept = {b: v for b, v in self.buckets[key].items() if b >= cutoff}
+            if kept:
+                self.buckets[key] = kept
+            else:
+                del self.buckets[key]
+
+    def to_dict(self):
+        return {key: {str(b): v for b, v in buckets.items()} for key, buckets in self.buckets.items()}
+
+    def load(self, data):
+        self.buckets = {key: {int(b): v for b, v in buckets.items()} for key, buckets in data.items()}
+
+
+class StreamingAlertEvaluator:
+    """
+    Evaluates alert rules on the API's JSON lines request log as it grows,
+    instead of re-reading a daily coverage report.
+
+    Each poll reads only the bytes appended since the saved offset, folds the
+    events into per-article and per-topic time buckets (scores per article
+    and scorer, since dense, fusion and cross-encoder scores have different
+    scales), and compares the
+    latest window (window_s) with the baseline before it (baseline_s):
+
+    - ctr_drop: article CTR fell by more than ctr_drop (relative) vs. baseline
+    - score_drop: article average score fell by more than score_drop (relative)
+    - zero_hit: a topic had at least zero_hit_min queries whose relevance
+      was below zero_hit_score (or that returned nothing). Relevance is the
+      best dense cosine the API logs with each impression, so the
+      threshold holds in hybrid and rerank modes too, whose fused and
+      cross-encoder scores are on other scales. Older events without it
+      fall back to their dense-scored results.
+
+    An alert fires when a rule starts breaching and again only after
+    cooldown_s if it is still breaching. Alerts are posted to the webhook in
+    batches of up to batch_size lines; failed posts are kept and retried on
+    the next poll. Offset, buckets and alert state live in state_path.
+    """
+
+    def __init__(self, webhook_url, log_path="logs/recommendations.jsonl",
+                 state_path="logs/alert_state.json", alert_log_path="logs/alerts5.log",
+                 window_s=3600, baseline_s=24 * 3600, bucket_s=60,
+                 ctr_drop=0.5, score_drop=0.2, min_impressions=20,
+                 zero_hit_score=0.3, zero_hit_min=5, cooldown_s=6 * 3600,
+                 batch_size=20, max_retries=3, backoff_factor=1.0, timeout=10,
+                 topic_fn=default_topic, session=None):
+        self.webhook_url = webhook_url
+        self.log_path = log_path
+        self.state_path = state_path
+        self.alert_log_path = alert_log_path
+        self.window_s = window_s
+        self.baseline_s = baseline_s
+        self.ctr_drop = ctr_drop
+        self.score_drop = score_drop
+        self.min_impressions = min_impressions
+        self.zero_hit_score = zero_hit_score
+        self.zero_hit_min = zero_hit_min
+        self.cooldown_s = cooldown_s
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.topic_fn = topic_fn
+        self.session = session or self._build_session(max_retries, backoff_factor)
+
+        self.articles = WindowCounter(bucket_s, window_s + baseline_s)
+        self.scores = WindowCounter(bucket_s, window_s + baseline_s)  # "scorer|article" -> score sums
+        self.topics = WindowCounter(bucket_s, window_s + baseline_s)
+        self.offset = 0
+        self.active = {}    # "rule|key" -> last time it was sent
+        self.pending = []   # alert lines not yet delivered
+        self._load_state()
+
+    def _build_session(self, max_retries, backoff_factor):
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(["POST"]),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        session = requests.Session()
+        session.mount("http://", HTTPAdapter(max_retries=retry))
+        session.mount("https://", HTTPAdapter(max_retries=retry))
+        return session
+
+    # STATE
+
+    def _load_state(self):
+        if not os.path.exists(self.state_path):
+            return
+        with open(self.state_path, "r") as f:
+            state = json.load(f)
+        self.offset = state.get("offset", 0)
+        self.active = state.get("active", {})
+        self.pending = state.get("pending", [])
+        self.articles.load(state.get("articles", {}))
+        self.scores.load(state.get("scores", {}))
+        self.topics.load(state.get("topics", {}))
+
+    def _save_state(self):
+        os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "offset": self.offset,
+                "active": self.active,
+                "pending": self.pending,
+                "articles": self.articles.to_dict(),
+                "scores": self.scores.to_dict(),
+                "topics": self.topics.to_dict(),
+            }, f)
+        os.replace(tmp_path, self.state_path)
+
+    # INGESTION
+
+    def read_new_events(self):
+        """Parse the complete lines appended to the log since the last offset."""
+        if not os.path.exists(self.log_path):
+            return []
+        if os.path.getsize(self.log_path) < self.offset:
+            print("Request log was truncated or rotated. Reading from the start.")
+            self.offset = 0
+
+        events = []
+        with open(self.log_path, "rb") as f:
+            f.seek(self.offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # partially written line, picked up next time
+                self.offset += len(line)
+                try:
+                    events.append(json.loads(line))
+                except json.JSONDecodeError:
+                    print("Skipping malformed log line:", line[:200])
+        return events
+
+    def ingest(self, events):
+        for event in events:
+            ts = event.get("ts", time.time())
+            if event.get("event") == "click":
+                self.articles.add(event.get("article_title", "Unknown"), ts, clicks=1)
+                continue
+
+            results = event.get("results") or []
+            if event.get("tier", "normal") != "normal":
+                # Load-shed responses log titles only: count impressions for CTR, nothing else
+                for rec in results:
+                    self.articles.add(rec.get("article_title", "Unknown"), ts, impressions=1)
+                continue
+            for rec in results:
+                title = rec.get("article_title", "Unknown")
+                self.articles.add(title, ts, impressions=1)
+                # Events logged before results carried a scorer only had dense scores
+                self.scores.add(f"{rec.get('scorer') or 'dense'}|{title}", ts,
+                                impressions=1, score_sum=float(rec.get("score", 0.0)))
+            zero_hit = self._is_zero_hit(event, results)
+            self.topics.add(self.topic_fn(event), ts, queries=1, zero_hits=int(zero_hit))
+
+    def _is_zero_hit(self, event, results):
+        if not results:
+            return True
+        if event.get("relevance") is not None:
+            return float(event["relevance"]) < self.zero_hit_score
+        dense = [float(r.get("score", 0.0)) for r in results if (r.get("scorer") or "dense") == "dense"]
+        # Only fused or cross-encoder scores: relevance unknown, not counted as a zero hit
+        return bool(dense) and max(dense) < self.zero_hit_score
+
+    # RULES
+
+    def _windows(self, counter, key, now):
+        window_start = now - self.window_s
+        return (counter.totals(key, window_start, now + 1),
+                counter.totals(key, window_start - self.baseline_s, window_start))
+
+    def evaluate(self, now=None):
+        """Return {"rule|key": message} for every rule currently breaching."""
+        now = now or time.time()
+        breaches = {}
+        for article in self.articles.buckets:
+            current, baseline = self._windows(self.articles, article, now)
+            if current["impressions"] < self.min_impressions or baseline["impressions"] < self.min_impressions:
+                continue
+
+            ctr, base_ctr = (current["clicks"] / current["impressions"],
+                             baseline["clicks"] / baseline["impressions"])
+            if base_ctr > 0 and ctr < base_ctr * (1 - self.ctr_drop):
+                breaches[f"ctr_drop|{article}"] = (
+                    f"CTR drop: '{article}' CTR {ctr:.1%} vs {base_ctr:.1%} baseline "
+                    f"({current['impressions']} impressions)")
+
+        for key in self.scores.buckets:
+            current, baseline = self._windows(self.scores, key, now)
+            if current["impressions"] < self.min_impressions or baseline["impressions"] < self.min_impressions:
+                continue
+            scorer, article = key.split("|", 1)
+            score, base_score = (current["score_sum"] / current["impressions"],
+                                 baseline["score_sum"] / baseline["impressions"])
+            if base_score > 0 and score < base_score * (1 - self.score_drop):
+                breaches[f"score_drop|{key}"] = (
+                    f"Score drop: '{article}' avg {scorer} score {score:.3f} vs {base_score:.3f} baseline")
+
+        for topic in self.topics.buckets:
+            current, _ = self._windows(self.topics, topic, now)
+            if current["zero_hits"] >= self.zero_hit_min:
+                breaches[f"zero_hit|{topic}"] = (
+                    f"Zero-hit topic: '{topic}' had {current['zero_hits']} of {current['queries']} "
+                    f"queries without a good match (score < {self.zero_hit_score})")
+        return breaches
+
+    def _new_alerts(self, breaches, now):
+        alerts = []
+        for key, message in breaches.items():
+            last_sent = self.active.get(key)
+            if last_sent is None or now - last_sent >= self.cooldown_s:
+                alerts.append(message)
+                self.active[key] = now
+        # A rule that stopped breaching can fire again the next time it breaches
+        for key in list(self.active):
+            if key not in breaches:
+                del self.active[key]
+        return alerts
+
+    # DELIVERY
+
+    def _post(self, lines):
+        payload = {"text": "*Recommendation Alerts*\n" + "\n".join(f"• {line}" for line in lines)}
+        try:
+            response = self.session.post(self.webhook_url, json=payload, timeout=self.timeout)
+            response.raise_for_status()
+            return True
+        except requests.exceptions.RequestException as e:
+            print(f"Failed to send alerts: {e}")
+            return False
+
+    def flush(self):
+        """Post pending alerts in batches. Undelivered ones stay pending."""
+        sent = 0
+        while self.pending:
+            batch = self.pending[:self.batch_size]
+            if not self._post(batch):
+                break
+            self.pending = self.pending[len(batch):]
+            sent += len(batch)
+        return sent
+
+    def poll(self, now=None):
+        """Read new log events, evaluate the rules and send new alerts."""
+        now = now or time.time()
+        events = self.read_new_events()
+        self.ingest(events)
+        self.articles.prune(now)
+        self.scores.prune(now)
+        self.topics.prune(now)
+
+        alerts = self._new_alerts(self.evaluate(now), now)
+        if alerts:
+            timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now))
+            os.makedirs(os.path.dirname(self.alert_log_path) or ".", exist_ok=True)
+            with open(self.alert_log_path, "a") as f:
+                f.write("\n".join(f"[{timestamp}] {a}" for a in alerts) + "\n")
+            self.pending.extend(alerts)
+
+        sent = self.flush() if self.pending else 0
+        self._save_state()
+        print(f"Processed {len(events)} events, {len(alerts)} new alerts, {sent} sent, {len(self.pending)} pending.")
+        return alerts
+
+    def run(self, interval=15):
+        """Poll whenever the log has grown, checking every interval seconds."""
+        print(f"Watching {self.log_path} for alerts... Press Ctrl+C to stop.\n")
+        while True:
+            size = os.path.getsize(self.log_path) if os.path.exists(self.log_path) else 0
+            if size != self.offset or self.pending:
+                self.poll()
+            time.sleep(interval)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream recommendation logs and send threshold alerts.")
+    parser.add_argument("--webhook-url", default=os.getenv("SLACK_WEBHOOK_URL"))
+    parser.add_argument("--log-path", default="logs/recommendations.jsonl")
+    parser.add_argument("--interval", type=float, default=15)
+    parser.add_argument("--once", action="store_true", help="Poll once and exit.")
+    args = parser.parse_args()
+
+    if not args.webhook_url:
+        raise ValueError("Pass --webhook-url or set SLACK_WEBHOOK_URL.")
+
+    evaluator = StreamingAlertEvaluator(args.webhook_url, log_path=args.log_path)
+    if args.once:
+        evaluator.poll()
+    else:
+        evaluator.run(interval=args.interval)
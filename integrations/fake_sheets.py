@@ -0,0 +1,65 @@
+import re
+
+
+class FakeWorksheet:
+    """
+    In-memory stand-in for a gspread Worksheet, for exercising the loader
+    without Google credentials. rows includes the header row. Mimics the
+    Sheets API trimming of trailing empty cells and rows, and counts the
+    API calls made.
+    """
+
+    def __init__(self, rows):
+        self.rows = [list(row) for row in rows]
+        self.calls = {"row_values": 0, "batch_get": 0, "get_all_records": 0}
+
+    def append_row(self, row):
+        self.rows.append(list(row))
+
+    def row_values(self, row):
+        self.calls["row_values"] += 1
+        return self._trim_cells(self.rows[row - 1]) if row <= len(self.rows) else []
+
+    def batch_get(self, ranges, **kwargs):
+        self.calls["batch_get"] += 1
+        return [self._get_range(r) for r in ranges]
+
+    def get_all_records(self):
+        self.calls["get_all_records"] += 1
+        header = self.rows[0]
+        return [dict(zip(header, row)) for row in self.rows[1:]]
+
+    def _get_range(self, a1_range):
+        match = re.fullmatch(r"(\d+):(\d+)", a1_range)
+        if not match:
+            raise ValueError(f"FakeWorksheet only supports whole-row ranges, got '{a1_range}'")
+        start, end = int(match.group(1)), int(match.group(2))
+        block = [self._trim_cells(row) for row in self.rows[start - 1:end]]
+        while block and not block[-1]:
+            block.pop()
+        return block
+
+    @staticmethod
+    def _trim_cells(row):
+        row = ["" if cell is None else str(cell) for cell in row]
+        while row and row[-1] == "":
+            row.pop()
+        return row
+
+
+class FakeSpreadsheet:
+    def __init__(self, worksheets):
+        self.worksheets = worksheets
+
+    def worksheet(self, name):
+        return self.worksheets[name]
+
+
+class FakeSheetsClient:
+    """Drop-in for the authorized gspread client: GoogleSheetLoader(..., client=FakeSheetsClient(...))."""
+
+    def __init__(self, spreadsheets):
+        self.spreadsheets = spreadsheets
+
+    def open(self, name):
+        return self.spreadsheets[name]
@@ -1,15 +1,24 @@
+import os
+import json
+import time
 import gspread
 import pandas as pd
 from oauth2client.service_account import ServiceAccountCredentials
 
 class GoogleSheetLoader:
-    def __init__(self, sheet_name, worksheet_name, creds_path):
+    def __init__(self, sheet_name, worksheet_name, creds_path, client=None):
         self.sheet_name = sheet_name
         self.worksheet_name = worksheet_name
         self.creds_path = creds_path
+        self.client = client  # optional pre-authorized (or fake) Sheets client
         self.df = None
+        self.header = None
+        self.checkpoint = None  # watermark of the last page yielded by iter_incremental(commit=False)
     
     def _authorize_google_sheet(self):
+        if self.client is not None:
+            return self.client
+
         scope = [
             "https://spreadsheets.google.com/feeds", 
             "https://www.googleapis.com/auth/drive"
@@ -19,12 +28,158 @@ class GoogleSheetLoader:
         client = gspread.authorize(creds)
         return client
 
-    def load_data(self):
+    def _open_worksheet(self):
         client = self._authorize_google_sheet()
-        sheet = client.open(self.sheet_name).worksheet(self.worksheet_name)
+        return client.open(self.sheet_name).worksheet(self.worksheet_name)
+
+    def load_data(self):
+        sheet = self._open_worksheet()
         data = sheet.get_all_records()
         self.df = pd.DataFrame(data)
         return self.df
+
+    def load_incremental(self, state_path="data/raw/ingest_state.json",
+                         store_dir="data/raw/tickets_store",
+                         batch_rows=500, ranges_per_call=4, key_column="ticket_id"):
+        """
+        Fetch only rows appended since the last run and append them to a
+        local Parquet store. Returns a DataFrame of the new rows only.
+        See iter_incremental, which this collects.
+        """
+        pages = list(self.iter_incremental(state_path, store_dir, batch_rows, ranges_per_call, key_column))
+        self.df = pd.concat(pages, ignore_index=True) if pages else pd.DataFrame(columns=self.header)
+        return self.df
+
+    def iter_incremental(self, state_path="data/raw/ingest_state.json",
+                         store_dir="data/raw/tickets_store",
+                         batch_rows=500, ranges_per_call=4, key_column="ticket_id", commit=True):
+        """
+        Yield the rows appended since the last run, one DataFrame per
+        values.batchGet call (up to batch_rows * ranges_per_call rows), so
+        callers never hold more than one page.
+
+        The watermark is the number of sheet data rows already ingested plus
+        the key of the last one. With commit=True each page is appended to
+        the Parquet store and the watermark saved before the page is
+        yielded. With commit=False nothing is saved: the page's checkpoint
+        is left in self.checkpoint for the caller to pass to commit() once
+        the page has been processed, so a failed run fetches it again. The
+        first call re-reads the last ingested row; if its key changed, the
+        sheet was rewritten and ingestion restarts from the top.
+        """
+        state = self._read_state(state_path)
+        sheet = self._open_worksheet()
+        header = self.header = state.get("header") or sheet.row_values(1)
+
+        ingested = state.get("rows_ingested", 0)
+        check_row = ingested + 1 if ingested else None  # sheet row of the last ingested record
+        next_row = ingested + 2                          # first data row not yet ingested
+
+        restarted, fetched = False, 0
+        while True:
+            ranges = [
+                f"{start}:{start + batch_rows - 1}"
+                for start in range(next_row, next_row + batch_rows * ranges_per_call, batch_rows)
+            ]
+            if check_row is not None:
+                ranges.insert(0, f"{check_row}:{check_row}")
+
+            values = sheet.batch_get(ranges)
+
+            if check_row is not None:
+                last_seen = self._to_records(header, values.pop(0))
+                last_key = last_seen[0].get(key_column) if last_seen else None
+                if str(last_key) != str(state.get("last_key")):
+                    print("Sheet changed above the watermark. Re-ingesting from the first row.")
+                    state, ingested, next_row, restarted = {}, 0, 2, True
+                    check_row = None
+                    continue
+                check_row = None
+
+            # Sheets trims trailing empty rows, so a short block is the end of the data
+            rows, done = [], False
+            for block in values:
+                rows.extend(self._to_records(header, block))
+                ingested += len(block)
+                if len(block) < batch_rows:
+                    done = True
+                    break
+
+            page = pd.DataFrame(rows, columns=header)
+            if not page.empty:
+                last_key = page[key_column].iloc[-1] if key_column in page.columns else None
+                checkpoint = {
+                    "page": page,
+                    "store_dir": store_dir,
+                    "reset": restarted,
+                    "state_path": state_path,
+                    "state": {
+                        "header": header,
+                        "rows_ingested": ingested,
+                        "last_key": None if last_key is None else str(last_key),
+                        "updated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    },
+                }
+                restarted = False
+                if commit:
+                    self.commit(checkpoint)
+                else:
+                    self.checkpoint = checkpoint
+                fetched += len(page)
+                yield page
+            if done:
+                break
+            next_row += batch_rows * ranges_per_call
+
+        print(f"Fetched {fetched} new rows (total ingested: {ingested}).")
+
+    @staticmethod
+    def _to_records(header, block):
+        # Sheets omits trailing empty cells and trailing empty rows
+        records = []
+        for row in block:
+            if not any(cell not in ("", None) for cell in row):
+                continue
+            padded = list(row) + [""] * (len(header) - len(row))
+            records.append(dict(zip(header, padded[:len(header)])))
+        return records
+
+    def commit(self, checkpoint):
+        """Append a page from iter_incremental to the store and save its watermark."""
+        self._append_to_store(checkpoint["page"], checkpoint["store_dir"], reset=checkpoint["reset"])
+        self._write_state(checkpoint["state_path"], checkpoint["state"])
+
+    @staticmethod
+    def _read_state(state_path):
+        if not os.path.exists(state_path):
+            return {}
+        with open(state_path, "r") as f:
+            return json.load(f)
+
+    @staticmethod
+    def _write_state(state_path, state):
+        os.makedirs(os.path.dirname(state_path) or ".", exist_ok=True)
+        tmp_path = state_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, state_path)
+
+    @staticmethod
+    def _append_to_store(df, store_dir, reset=False):
+        os.makedirs(store_dir, exist_ok=True)
+        if reset:
+            for name in os.listdir(store_dir):
+                if name.endswith(".parquet"):
+                    os.remove(os.path.join(store_dir, name))
+        part = os.path.join(store_dir, f"part-{time.strftime('%Y%m%d-%H%M%S')}-{time.time_ns() % 10**9:09d}.parquet")
+        df.astype(str).to_parquet(part, index=False)
+
+    @staticmethod
+    def load_store(store_dir="data/raw/tickets_store", columns=None):
+        """Read all tickets ingested so far from the local Parquet store."""
+        if not os.path.isdir(store_dir) or not any(n.endswith(".parquet") for n in os.listdir(store_dir)):
+            return pd.DataFrame(columns=columns)
+        return pd.read_parquet(store_dir, columns=columns)
     
     def get_dataframe(self):
         if self.df is not None:
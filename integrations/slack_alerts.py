@@ -4,19 +4,20 @@ import datetime
 import os
 import requests
 import dotenv
+from src.storage import read_table
 
 # Load environment variables from .env file
 dotenv.load_dotenv()
 
 
 class DailyAlertScheduler:
-    def __init__(self, slack_webhook_url, coverage_report_path="logs/coverage_report5.csv", alert_log_path="logs/alerts5.log"):
+    def __init__(self, slack_webhook_url, coverage_report_path="logs/coverage_report5.parquet", alert_log_path="logs/alerts5.log", scheduler=None):
         self.slack_webhook_url = slack_webhook_url
         self.coverage_report_path = coverage_report_path
         self.alert_log_path = alert_log_path
 
-        # Initialize the scheduler
-        self.scheduler = BlockingScheduler()
+        # Initialize the scheduler (callers such as the dashboard can pass a BackgroundScheduler)
+        self.scheduler = scheduler if scheduler is not None else BlockingScheduler()
 
         # Set thresholds
         self.CTR_THRESHOLD = 0.5
@@ -44,7 +45,7 @@ class DailyAlertScheduler:
             return
 
         # Load coverage report
-        df = pd.read_csv(self.coverage_report_path)
+        df = read_table(self.coverage_report_path, columns=["article", "CTR", "impressions"])
 
         # Filter low CTR articles
         low_ctr = df[df["CTR"] < self.CTR_THRESHOLD]
@@ -92,5 +93,5 @@ if __name__ == "__main__":
         raise ValueError("SLACK_WEBHOOK_URL environment variable not set.")
     
     # Initialize and start the alert scheduler
-    alert_scheduler = DailyAlertScheduler(slack_webhook_url=SLACK_WEBHOOK_URL, coverage_report_path="logs/coverage_report5.csv", alert_log_path="logs/alerts5.log")
+    alert_scheduler = DailyAlertScheduler(slack_webhook_url=SLACK_WEBHOOK_URL, coverage_report_path="logs/coverage_report5.parquet", alert_log_path="logs/alerts5.log")
     alert_scheduler.start()
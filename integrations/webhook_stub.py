@@ -0,0 +1,58 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class WebhookStub:
+    """
+    Local HTTP stand-in for a Slack incoming webhook, for exercising the
+    alerting without posting to Slack. Records every JSON payload it
+    receives; the first fail_first requests get fail_status instead of 200.
+
+        with WebhookStub() as stub:
+            evaluator = StreamingAlertEvaluator(stub.url)
+            ...
+            print(stub.payloads)
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, fail_first=0, fail_status=503):
+        self.payloads = []
+        self.requests = 0
+        self.fail_first = fail_first
+        self.fail_status = fail_status
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                stub.requests += 1
+                if stub.requests <= stub.fail_first:
+                    self.send_response(stub.fail_status)
+                    self.send_header("Retry-After", "0")
+                    self.end_headers()
+                    return
+                stub.payloads.append(json.loads(body or b"{}"))
+                self.send_response(200)
+                self.end_headers()
+                self.wfile.write(b"ok")
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.url = f"http://{host}:{self.server.server_address[1]}/webhook"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -1,9 +1,91 @@
 import os
+import time
 import pickle
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 import faiss
 import numpy as np
 import pandas as pd
-from sentence_transformers import SentenceTransformer
+from src.encoders import load_encoder, ensure_onnx_export
+from src.lexical_index import BM25Index
+from src.evaluation import recall_at_k
+
+
+# Vector storage modes: float32 flat, or FAISS scalar quantizers
+STORAGE_TYPES = {
+    "flat": None,
+    "sqfp16": faiss.ScalarQuantizer.QT_fp16,
+    "sq8": faiss.ScalarQuantizer.QT_8bit,
+}
+
+
+def make_index(embeds, storage="flat"):
+    """Create, train and fill an inner product index for the storage mode."""
+    if storage not in STORAGE_TYPES:
+        raise ValueError(f"Unknown storage '{storage}'. Expected one of {list(STORAGE_TYPES)}.")
+
+    embeds = np.ascontiguousarray(embeds, dtype=np.float32)
+    dim = embeds.shape[1]
+    if storage == "flat":
+        index = faiss.IndexFlatIP(dim)
+    else:
+        index = faiss.IndexScalarQuantizer(dim, STORAGE_TYPES[storage], faiss.METRIC_INNER_PRODUCT)
+        index.train(embeds)
+    index.add(embeds)
+    return index
+
+
+def train_projection(embeds, method="pca", dim=128):
+    """Train a PCA or OPQ projection of the embeddings to dim dimensions."""
+    embeds = np.ascontiguousarray(embeds, dtype=np.float32)
+    d_in = embeds.shape[1]
+    if method == "pca":
+        transform = faiss.PCAMatrix(d_in, dim)
+    elif method == "opq":
+        if len(embeds) < 256:
+            raise ValueError("OPQ needs at least 256 training vectors. Use 'pca' for small knowledge bases.")
+        transform = faiss.OPQMatrix(d_in, int(np.gcd(dim, 16)), dim)
+    else:
+        raise ValueError(f"Unknown projection '{method}'. Expected 'pca' or 'opq'.")
+    transform.train(embeds)
+    return transform
+
+
+# Encoder of the current worker process, loaded once by _init_encode_worker
+_worker_model = None
+
+
+def _init_encode_worker(model_name, backend, onnx_dir, quantize, num_threads, bucketed=False, max_tokens=None):
+    global _worker_model
+    # Pin the thread pools before any numeric library starts its own
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(num_threads)
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+    faiss.omp_set_num_threads(num_threads)
+    _worker_model = load_encoder(model_name, backend=backend, onnx_dir=onnx_dir, quantize=quantize,
+                                 num_threads=num_threads, bucketed=bucketed, max_tokens=max_tokens)
+
+
+def _encode_shard(texts, batch_size):
+    return np.asarray(_worker_model.encode(texts, batch_size=batch_size, convert_to_numpy=True), dtype=np.float32)
+
+
+def length_sorted_shards(texts, shard_size):
+    """
+    Split article positions into shards of similar text length, longest
+    first, so batches inside a shard need little padding and the slowest
+    shards start earliest.
+    """
+    lengths = np.fromiter((len(t) for t in texts), dtype=np.int64, count=len(texts))
+    order = np.argsort(-lengths, kind="stable")
+    return [order[i:i + shard_size] for i in range(0, len(order), shard_size)]
+
+
+def apply_projection(transform, embeds):
+    """Project embeddings and re-normalize them for inner product search."""
+    projected = np.ascontiguousarray(transform.apply(np.ascontiguousarray(embeds, dtype=np.float32)))
+    faiss.normalize_L2(projected)
+    return projected
 
 
 class KnowledgeBaseIndexer:
@@ -15,13 +97,41 @@ class KnowledgeBaseIndexer:
     def __init__(self, 
                  data_path="data/raw/knowledge_base_articles2.csv",
                  model_name="all-MiniLM-L6-v2",
-                 output_dir="models"):
+                 output_dir="models",
+                 build_lexical=True,
+                 encoder_backend="torch",
+                 quantize=True,
+                 storage="flat",
+                 embedding_dtype="float32",
+                 projection=None,
+                 projection_dim=128,
+                 encode_workers=1,
+                 threads_per_worker=None,
+                 batch_size=32,
+                 bucketed=False,
+                 max_tokens=None):
         self.data_path = data_path
         self.model_name = model_name
         self.output_dir = output_dir
+        self.encoder_backend = encoder_backend
+        self.quantize = quantize
+        self.onnx_dir = os.path.join(output_dir, "onnx")
+        self.build_lexical = build_lexical
+        self.storage = storage
+        self.embedding_dtype = embedding_dtype
+        self.projection = projection
+        self.projection_dim = projection_dim
+        self.encode_workers = encode_workers
+        self.threads_per_worker = threads_per_worker
+        self.batch_size = batch_size
+        # Length-bucketed batching (BucketedEncoder) truncating at max_tokens
+        self.bucketed = bucketed
+        self.max_tokens = max_tokens
+        self.transform = None
         self.articles = None
         self.embeds = None
         self.index = None
+        self.lexical_index = None
         self.model = None
 
         os.makedirs(self.output_dir, exist_ok = True)
@@ -40,31 +150,183 @@ class KnowledgeBaseIndexer:
         print(f"Loaded {len(self.articles)} articles.")
     
     def load_model(self):
-        """Load SentenceTransformer model."""
-        self.model = SentenceTransformer(self.model_name)
+        """Load the sentence encoder for the configured backend."""
+        self.model = load_encoder(self.model_name, backend=self.encoder_backend,
+                                  onnx_dir=self.onnx_dir, quantize=self.quantize,
+                                  bucketed=self.bucketed, max_tokens=self.max_tokens)
     
     def compute_embeddings(self, normalize=True):
         """Generate embeddings for articles using SentenceTransformer."""
         if self.articles is None:
             raise ValueError("Articles not loaded. Run load_data() first.")
-        if self.model is None:
-            self.load_model()
 
         texts = self.articles["text"].tolist()
-        self.embeds = self.model.encode(texts, convert_to_numpy=True)
+        if self.encode_workers > 1:
+            self.embeds = self._compute_embeddings_parallel(texts)
+        else:
+            if self.model is None:
+                self.load_model()
+            self.embeds = self.model.encode(texts, batch_size=self.batch_size, convert_to_numpy=True)
 
         if normalize:
             faiss.normalize_L2(self.embeds)
+
+        # Keep a reduced-precision copy in memory if requested
+        self.embeds = self.embeds.astype(self.embedding_dtype, copy=False)
     
+    def _compute_embeddings_parallel(self, texts, shards_per_worker=8):
+        """
+        Encode texts in a pool of encode_workers processes, each with its own
+        encoder copy and threads_per_worker threads. Shards are grouped by
+        text length and their vectors are written into a preallocated array
+        at the articles' original positions as they arrive, in order.
+        """
+        if not texts:
+            # Nothing to shard; still return a (0, dim) array like the single-process path
+            if self.model is None:
+                self.load_model()
+            dim = np.asarray(self.model.encode([""], convert_to_numpy=True)).shape[1]
+            return np.empty((0, dim), dtype=np.float32)
+        if self.encoder_backend == "onnx":
+            # Export once here; workers exporting at the same time would race on the same files
+            ensure_onnx_export(self.model_name, onnx_dir=self.onnx_dir, quantize=self.quantize)
+
+        workers = self.encode_workers
+        threads = self.threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+        shard_size = max(self.batch_size, -(-len(texts) // (workers * shards_per_worker)))
+        shards = length_sorted_shards(texts, shard_size)
+
+        print(f"Encoding {len(texts)} articles in {len(shards)} shards on {workers} processes x {threads} threads...")
+        start = time.perf_counter()
+        embeds = None
+        # spawn: workers start clean instead of inheriting the parent's thread pools
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_encode_worker,
+            initargs=(self.model_name, self.encoder_backend, self.onnx_dir, self.quantize, threads,
+                      self.bucketed, self.max_tokens),
+        ) as pool:
+            shard_texts = ([texts[i] for i in shard] for shard in shards)
+            results = pool.map(_encode_shard, shard_texts, [self.batch_size] * len(shards))
+            for shard, vectors in zip(shards, results):
+                if embeds is None:
+                    embeds = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+                embeds[shard] = vectors
+
+        elapsed = time.perf_counter() - start
+        print(f"Encoded {len(texts)} articles in {elapsed:.1f}s ({len(texts) / max(elapsed, 1e-9):.0f} articles/s).")
+        return embeds
+
     def build_index(self):
-        """Build FAISS inner product index."""
+        """Build FAISS inner product index using the configured storage mode."""
+        if self.embeds is None:
+            raise ValueError("Embeddings not computed. Run compute_embeddings() first.")
+
+        vectors = self.embeds
+        if self.projection:
+            self.transform = train_projection(self.embeds, self.projection, self.projection_dim)
+            vectors = apply_projection(self.transform, self.embeds)
+            print(f"Trained {self.projection.upper()} projection {self.embeds.shape[1]} -> {self.projection_dim} dims.")
+
+        self.index = make_index(vectors, self.storage)
+        print(f"FAISS index ({self.storage}) built with {self.index.ntotal} entries.")
+
+    def _float32_embeds(self):
+        """
+        Float32 article embeddings for the evaluation baselines. When the
+        embeddings are kept as float16, upcasting them would keep their
+        rounding error, so the articles are encoded again instead.
+        """
+        if self.embeds.dtype == np.float32:
+            return self.embeds
+        print(f"Re-encoding articles in float32 for the baseline (embeddings are kept as {self.embeds.dtype}).")
+        embeds = np.asarray(self.model.encode(self.articles["text"].tolist(), batch_size=self.batch_size,
+                                              convert_to_numpy=True), dtype=np.float32)
+        faiss.normalize_L2(embeds)
+        return embeds
+
+    def evaluate_storage(self, queries, k=10, storages=("flat", "sqfp16", "sq8")):
+        """
+        Measure recall@k, index size and search latency of each storage
+        mode against the float32 flat baseline.
+        """
+        if self.embeds is None:
+            raise ValueError("Embeddings not computed. Run compute_embeddings() first.")
+        if self.model is None:
+            self.load_model()  # not loaded in this process when encoding ran in a worker pool
+
+        embeds = self._float32_embeds()
+        query_embeds = self.model.encode(queries, convert_to_numpy=True).astype(np.float32)
+        faiss.normalize_L2(query_embeds)
+        baseline_ids = make_index(embeds, "flat").search(query_embeds, k)[1]
+
+        runs = [(storage, storage, embeds) for storage in storages]
+        if self.embeds.dtype != np.float32:
+            # The reduced-precision copy itself, to show what it costs in recall
+            runs.append((f"flat ({self.embeds.dtype} embeds)", "flat", self.embeds))
+
+        rows = []
+        for label, storage, vectors in runs:
+            index = make_index(vectors, storage)
+            start = time.perf_counter()
+            ids = index.search(query_embeds, k)[1]
+            elapsed = time.perf_counter() - start
+            rows.append({
+                "storage": label,
+                f"recall@{k}": recall_at_k(baseline_ids, ids, k),
+                "index_bytes": int(faiss.serialize_index(index).size),
+                "search_ms_per_query": elapsed * 1000 / max(len(queries), 1),
+            })
+
+        report = pd.DataFrame(rows)
+        print(report.to_string(index=False))
+        return report
+
+    def evaluate_projection(self, queries, dims=(64, 128, 192), k=10, method="pca"):
+        """
+        Measure recall@k and search latency at several projected dimensions
+        against the full-dimensional flat baseline.
+        """
         if self.embeds is None:
             raise ValueError("Embeddings not computed. Run compute_embeddings() first.")
+        if self.model is None:
+            self.load_model()  # not loaded in this process when encoding ran in a worker pool
+
+        embeds = self._float32_embeds()
+        query_embeds = self.model.encode(queries, convert_to_numpy=True).astype(np.float32)
+        faiss.normalize_L2(query_embeds)
+        baseline_ids = make_index(embeds, "flat").search(query_embeds, k)[1]
+
+        rows = []
+        for dim in [None, *dims]:
+            if dim is None:
+                index, q = make_index(embeds, self.storage), query_embeds
+            else:
+                transform = train_projection(embeds, method, dim)
+                index = make_index(apply_projection(transform, embeds), self.storage)
+                q = apply_projection(transform, query_embeds)
 
-        dim = self.embeds.shape[1]
-        self.index = faiss.IndexFlatIP(dim)
-        self.index.add(self.embeds)
-        print(f"FAISS index built with {self.index.ntotal} entries.")
+            start = time.perf_counter()
+            ids = index.search(q, k)[1]
+            elapsed = time.perf_counter() - start
+            rows.append({
+                "dim": dim or embeds.shape[1],
+                "method": method if dim else "none",
+                f"recall@{k}": recall_at_k(baseline_ids, ids, k),
+                "search_ms_per_query": elapsed * 1000 / max(len(queries), 1),
+            })
+
+        report = pd.DataFrame(rows)
+        print(report.to_string(index=False))
+        return report
+
+    def build_lexical_index(self):
+        """Build BM25 inverted index over the same article texts."""
+        if self.articles is None:
+            raise ValueError("Articles not loaded. Run load_data() first.")
+
+        self.lexical_index = BM25Index().build(self.articles["text"].tolist())
     
     def save_index(self):
         """Save FAISS index, metadata, and model info."""
@@ -73,28 +335,56 @@ class KnowledgeBaseIndexer:
         
         index_path = os.path.join(self.output_dir, "article_index.faiss")
         meta_path = os.path.join(self.output_dir, "articles_meta.pkl")
+        embeds_path = os.path.join(self.output_dir, "article_embeds.npy")
+        projection_path = os.path.join(self.output_dir, "article_projection.vt")
         model_info_path = os.path.join(self.output_dir, "embed_model.pkl")
 
         faiss.write_index(self.index, index_path)
         self.articles.to_pickle(meta_path)
+        if self.embeds is not None:
+            np.save(embeds_path, self.embeds)
+        if self.transform is not None:
+            faiss.write_VectorTransform(self.transform, projection_path)
+        elif os.path.exists(projection_path):
+            os.remove(projection_path)
         with open(model_info_path, "wb") as f:
-            pickle.dump({"model_name": self.model_name}, f)
+            pickle.dump({
+                "model_name": self.model_name,
+                "backend": self.encoder_backend,
+                # Relative to the KB directory, so the index still finds it from another cwd or model_dir
+                "onnx_dir": os.path.relpath(self.onnx_dir, self.output_dir),
+                "quantize": self.quantize,
+                "storage": self.storage,
+                "projection": self.projection if self.transform is not None else None,
+                "index_version": time.strftime("%Y%m%d%H%M%S"),
+            }, f)
 
         print(f"Saved index and metadata in '{self.output_dir}'")
         print(f" - Index: {index_path}")
         print(f" - Metadata: {meta_path}")
+        print(f" - Embeddings ({self.embeds.dtype if self.embeds is not None else 'none'}): {embeds_path}")
+        if self.transform is not None:
+            print(f" - Projection: {projection_path}")
         print(f" - Model info: {model_info_path}")
 
+        if self.lexical_index is not None:
+            lexical_path = os.path.join(self.output_dir, "article_bm25.npz")
+            self.lexical_index.save(lexical_path)
+            print(f" - Lexical index: {lexical_path}")
+
     def run_full_pipeline(self):
         """Run the full indexing pipeline: load → encode → build → save."""
         self.load_data()
-        self.load_model()
+        if self.encode_workers <= 1:
+            self.load_model()  # parallel encoding loads a model in each worker instead
         self.compute_embeddings()
         self.build_index()
+        if self.build_lexical:
+            self.build_lexical_index()
         self.save_index()
 
 
-# Example usage
+# Example usage (from the project root): python -m src.build_index
 if __name__ == "__main__":
     indexer = KnowledgeBaseIndexer()
     indexer.run_full_pipeline()
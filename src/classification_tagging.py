@@ -4,6 +4,7 @@ import time
 import pandas as pd
 from groq import Groq
 from dotenv import load_dotenv
+from src.storage import read_table, write_table
 
 
 class TicketClassifier:
@@ -36,7 +37,8 @@ class TicketClassifier:
 
     def load_tickets(self, filepath: str):
         try:
-            df = pd.read_csv(filepath)
+            df = read_table(filepath, columns=["ticket_id", "clean_text"])
+            self.ticket_ids = df["ticket_id"].tolist()
             self.tickets = df["clean_text"].tolist()
             print(f"Info: Loaded {len(self.tickets)} tickets for classification.\n")
         except FileNotFoundError:
@@ -151,19 +153,22 @@ class TicketClassifier:
             }
 
     def classify_all(self, ticket_id: list[str], text: list[str], rate_limit = 1):
+        # Results are collected per call and returned, so callers sharing one classifier don't mix them
         print("Ticket classification started...\n")
-        self.results = []
+        results = []
 
         for ticket_id, text in zip(ticket_id, text):
             result = self.classify_ticket(ticket_id,text)
-            self.results.append(result)
+            results.append(result)
             time.sleep(rate_limit)
 
+        self.results = results
         print("Ticket classification completed.\n")
+        return results
 
-    def save_results(self, output_path="data/processed/classified_tickets6.csv"):
+    def save_results(self, output_path="data/processed/classified_tickets6.parquet"):
         results_df = pd.DataFrame(self.results)
-        results_df.to_csv(output_path, index=False)
+        write_table(results_df, output_path, schema="classified")
         print(f"Results saved to '{output_path}'.")
 
         # Log errors if any
@@ -181,6 +186,6 @@ class TicketClassifier:
 # Example Usage
 if __name__ == "__main__":
     classifier = TicketClassifier()
-    classifier.load_tickets("data/processed/preprocessed_tickets6.csv")
+    classifier.load_tickets("data/processed/preprocessed_tickets6.parquet")
     classifier.classify_all(rate_limit=1)
-    classifier.save_results("data/processed/classified_tickets6.csv")
+    classifier.save_results("data/processed/classified_tickets6.parquet")
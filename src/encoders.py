@@ -0,0 +1,293 @@
+import os
+import time
+import zlib
+import threading
+import faiss
+import numpy as np
+from src.evaluation import recall_at_k, cosine_agreement
+
+
+ENCODER_BACKENDS = ("torch", "onnx", "stub")
+
+
+def load_encoder(model_name, backend="torch", onnx_dir="models/onnx", quantize=True, num_threads=None,
+                 bucketed=False, max_tokens=None):
+    """
+    Load a sentence encoder for the given backend.
+
+    Every backend exposes the SentenceTransformer-style
+    encode(texts, convert_to_numpy=True, batch_size=...) call, so the
+    indexer and the API can use them interchangeably. num_threads caps
+    the intra-op threads of the torch / ONNX Runtime backends. With
+    bucketed=True the encoder is wrapped in a BucketedEncoder.
+    """
+    if backend == "torch":
+        if num_threads:
+            import torch
+            torch.set_num_threads(num_threads)
+        from sentence_transformers import SentenceTransformer
+        encoder = SentenceTransformer(model_name)
+    elif backend == "onnx":
+        encoder = OnnxEncoder(model_name, onnx_dir=onnx_dir, quantize=quantize, num_threads=num_threads)
+    elif backend == "stub":
+        encoder = HashingEncoder()
+    else:
+        raise ValueError(f"Unknown encoder backend '{backend}'. Expected one of {ENCODER_BACKENDS}.")
+    return BucketedEncoder(encoder, max_tokens=max_tokens) if bucketed else encoder
+
+
+def export_onnx(model_name, onnx_dir="models/onnx", quantize=True, opset=14):
+    """
+    Export the transformer behind a SentenceTransformer model to ONNX and
+    optionally apply dynamic int8 quantization to its weights.
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    os.makedirs(onnx_dir, exist_ok=True)
+    hf_name = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+    tokenizer = AutoTokenizer.from_pretrained(hf_name)
+    model = AutoModel.from_pretrained(hf_name).eval()
+
+    fp32_path = os.path.join(onnx_dir, "encoder.onnx")
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (sample["input_ids"], sample["attention_mask"], sample["token_type_ids"]),
+            fp32_path,
+            input_names=["input_ids", "attention_mask", "token_type_ids"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "seq"},
+                "attention_mask": {0: "batch", 1: "seq"},
+                "token_type_ids": {0: "batch", 1: "seq"},
+                "last_hidden_state": {0: "batch", 1: "seq"},
+            },
+            opset_version=opset,
+        )
+    tokenizer.save_pretrained(onnx_dir)
+    print(f"Exported ONNX encoder to '{fp32_path}'")
+
+    if quantize:
+        int8_path = os.path.join(onnx_dir, "encoder.int8.onnx")
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+        print(f"Quantized ONNX encoder saved to '{int8_path}'")
+        return int8_path
+    return fp32_path
+
+
+def ensure_onnx_export(model_name, onnx_dir="models/onnx", quantize=True):
+    """Path of the exported ONNX model in onnx_dir, exporting it first if it is missing."""
+    model_path = os.path.join(onnx_dir, "encoder.int8.onnx" if quantize else "encoder.onnx")
+    if not os.path.exists(model_path):
+        model_path = export_onnx(model_name, onnx_dir=onnx_dir, quantize=quantize)
+    return model_path
+
+
+class OnnxEncoder:
+    """
+    Sentence encoder running an exported model on ONNX Runtime (CPU).
+
+    Reproduces the mean pooling + L2 normalization of the MiniLM
+    SentenceTransformer pipeline. The model is exported on first use if
+    it is not already present in onnx_dir.
+    """
+
+    def __init__(self, model_name, onnx_dir="models/onnx", quantize=True, max_seq_length=256, num_threads=None):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self.model_name = model_name
+        self.max_seq_length = max_seq_length
+
+        model_path = ensure_onnx_export(model_name, onnx_dir=onnx_dir, quantize=quantize)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+
+        self.tokenizer = AutoTokenizer.from_pretrained(onnx_dir)
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def encode(self, texts, batch_size=32, convert_to_numpy=True, normalize_embeddings=True, **kwargs):
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            tokens = self.tokenizer(
+                list(texts[start:start + batch_size]),
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np",
+            )
+            feeds = {k: v.astype(np.int64) for k, v in tokens.items() if k in self.input_names}
+            hidden = self.session.run(None, feeds)[0]
+
+            mask = tokens["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+            if normalize_embeddings:
+                pooled /= np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+            batches.append(pooled.astype(np.float32))
+
+        if not batches:
+            return np.zeros((0, self.session.get_outputs()[0].shape[-1]), dtype=np.float32)
+        return np.vstack(batches)
+
+
+class HashingEncoder:
+    """
+    Deterministic offline encoder that hashes tokens into a fixed-size
+    vector. Needs no model download, for benchmarks and local testing.
+    """
+
+    def __init__(self, dim=384):
+        self.dim = dim
+        self.model_name = "stub"
+
+    def encode(self, texts, batch_size=32, convert_to_numpy=True, normalize_embeddings=True, **kwargs):
+        embeds = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in str(text).lower().split():
+                h = zlib.crc32(token.encode("utf-8"))
+                embeds[row, h % self.dim] += 1.0 if (h >> 16) & 1 else -1.0
+        if normalize_embeddings:
+            embeds /= np.maximum(np.linalg.norm(embeds, axis=1, keepdims=True), 1e-12)
+        return embeds
+
+
+class BucketedEncoder:
+    """
+    Wraps an encoder so that mixed-length texts are encoded with little
+    padding. Texts are measured in tokens, truncated to max_tokens, grouped
+    into length buckets and sorted within them. Each batch holds up to
+    max_batch_tokens padded tokens, so short texts go in large batches and
+    long ones in small batches. Embeddings are returned in input order.
+
+    Any other attribute is looked up on the wrapped encoder, so it can
+    replace a SentenceTransformer transparently.
+    """
+
+    def __init__(self, encoder, max_tokens=None, buckets=(16, 32, 64, 128, 256, 512),
+                 max_batch_tokens=4096):
+        self.encoder = encoder
+        self.tokenizer = getattr(encoder, "tokenizer", None)
+        # Never above the encoder's own limit: longer inputs overflow its position embeddings
+        model_max = getattr(encoder, "max_seq_length", None)
+        if max_tokens and model_max:
+            max_tokens = min(max_tokens, model_max)
+        self.max_tokens = max_tokens or model_max or buckets[-1]
+        self.buckets = tuple(b for b in buckets if b < self.max_tokens) + (self.max_tokens,)
+        self.max_batch_tokens = max_batch_tokens
+        # Truncate inside the wrapped encoder at the same budget
+        if hasattr(encoder, "max_seq_length"):
+            encoder.max_seq_length = self.max_tokens
+        self.stats = {"texts": 0, "batches": 0, "tokens": 0, "padded_tokens": 0}
+        self._stats_lock = threading.Lock()  # the API shares one encoder across request threads
+
+    def __getattr__(self, name):
+        if name == "encoder":
+            raise AttributeError(name)
+        return getattr(self.encoder, name)
+
+    def token_lengths(self, texts):
+        """Token count of each text (whitespace words if there is no tokenizer), capped at max_tokens."""
+        if self.tokenizer is not None:
+            ids = self.tokenizer(list(texts), add_special_tokens=True, truncation=False)["input_ids"]
+            lengths = np.fromiter((len(i) for i in ids), dtype=np.int64, count=len(texts))
+        else:
+            lengths = np.fromiter((len(str(t).split()) + 2 for t in texts), dtype=np.int64, count=len(texts))
+        return np.minimum(lengths, self.max_tokens)
+
+    def plan(self, lengths):
+        """Group text positions into batches by length bucket. Returns a list of position arrays."""
+        bucket_of = np.searchsorted(self.buckets, lengths)
+        order = np.lexsort((lengths, bucket_of))
+        batches = []
+        for bucket in np.unique(bucket_of):
+            positions = order[bucket_of[order] == bucket]
+            size = max(1, self.max_batch_tokens // self.buckets[bucket])
+            batches.extend(positions[i:i + size] for i in range(0, len(positions), size))
+        return batches
+
+    def encode(self, texts, batch_size=None, convert_to_numpy=True, **kwargs):
+        # batch_size is ignored: batches are sized by max_batch_tokens instead
+        texts = list(texts)
+        if not texts:
+            return self.encoder.encode(texts, convert_to_numpy=True, **kwargs)
+
+        lengths = self.token_lengths(texts)
+        embeds = None
+        for positions in self.plan(lengths):
+            batch = [texts[i] for i in positions]
+            vectors = np.asarray(self.encoder.encode(batch, batch_size=len(batch), convert_to_numpy=True, **kwargs))
+            if embeds is None:
+                embeds = np.empty((len(texts), vectors.shape[1]), dtype=vectors.dtype)
+            embeds[positions] = vectors
+
+            with self._stats_lock:
+                self.stats["batches"] += 1
+                self.stats["tokens"] += int(lengths[positions].sum())
+                self.stats["padded_tokens"] += int(lengths[positions].max()) * len(positions)
+        with self._stats_lock:
+            self.stats["texts"] += len(texts)
+        return embeds
+
+
+def padding_ratio(lengths, batches):
+    """Padded tokens / real tokens when encoding the given batches of positions."""
+    real = sum(int(lengths[b].sum()) for b in batches)
+    padded = sum(int(lengths[b].max()) * len(b) for b in batches)
+    return padded / max(real, 1)
+
+
+def check_parity(reference, candidate, corpus_texts, query_texts, k=10):
+    """
+    Compare a candidate encoder against a reference encoder.
+
+    Reports the cosine agreement between both embeddings of the same corpus
+    texts, the recall@k of the candidate's search results against the
+    reference's on held-out queries, and the per-query encode latency.
+    """
+    ref_corpus = reference.encode(corpus_texts, convert_to_numpy=True).astype(np.float32)
+    cand_corpus = candidate.encode(corpus_texts, convert_to_numpy=True).astype(np.float32)
+    cosines = cosine_agreement(ref_corpus, cand_corpus)
+
+    def timed_encode(encoder):
+        start = time.perf_counter()
+        embeds = np.vstack([encoder.encode([q], convert_to_numpy=True) for q in query_texts]).astype(np.float32)
+        return embeds, (time.perf_counter() - start) * 1000 / max(len(query_texts), 1)
+
+    ref_queries, ref_ms = timed_encode(reference)
+    cand_queries, cand_ms = timed_encode(candidate)
+
+    def search(corpus, queries):
+        faiss.normalize_L2(corpus)
+        faiss.normalize_L2(queries)
+        index = faiss.IndexFlatIP(corpus.shape[1])
+        index.add(corpus)
+        return index.search(queries, k)[1]
+
+    report = {
+        "cosine_mean": float(cosines.mean()),
+        "cosine_min": float(cosines.min()),
+        f"recall@{k}": recall_at_k(search(ref_corpus, ref_queries), search(cand_corpus, cand_queries), k),
+        "reference_query_ms": ref_ms,
+        "candidate_query_ms": cand_ms,
+    }
+    return report
+
+
+# Example usage
+if __name__ == "__main__":
+    import pandas as pd
+
+    articles = pd.read_csv("data/raw/knowledge_base_articles2.csv", encoding="ISO-8859-1")
+    corpus = (articles["title"] + " " + articles["body"]).tolist()
+    queries = pd.read_csv("data/raw/tickets6.csv")["ticket_text"].astype(str).tolist()
+
+    reference = load_encoder("all-MiniLM-L6-v2", backend="torch")
+    candidate = load_encoder("all-MiniLM-L6-v2", backend="onnx")
+    print(check_parity(reference, candidate, corpus, queries, k=10))
@@ -0,0 +1,29 @@
+import numpy as np
+
+
+def recall_at_k(reference_ids, candidate_ids, k):
+    """
+    Average overlap between the reference top-k and the candidate top-k.
+
+    Both arguments are (num_queries, >=k) arrays of result ids, as returned
+    by a FAISS search. Missing results (-1) are ignored.
+    """
+    reference_ids = np.asarray(reference_ids)[:, :k]
+    candidate_ids = np.asarray(candidate_ids)[:, :k]
+
+    recalls = []
+    for ref, cand in zip(reference_ids, candidate_ids):
+        ref = set(ref[ref >= 0].tolist())
+        if not ref:
+            continue
+        recalls.append(len(ref & set(cand[cand >= 0].tolist())) / len(ref))
+    return float(np.mean(recalls)) if recalls else 0.0
+
+
+def cosine_agreement(reference, candidate):
+    """Row-wise cosine similarity between two embedding matrices."""
+    reference = np.asarray(reference, dtype=np.float32)
+    candidate = np.asarray(candidate, dtype=np.float32)
+    num = (reference * candidate).sum(axis=1)
+    den = np.linalg.norm(reference, axis=1) * np.linalg.norm(candidate, axis=1)
+    return num / np.maximum(den, 1e-12)
@@ -2,6 +2,7 @@ import os
 import ast
 import numpy as np
 import pandas as pd
+from src.storage import is_parquet, read_table, table_columns, to_python, write_table
 
 
 class RecommendationAnalyzer:
@@ -18,12 +19,20 @@ class RecommendationAnalyzer:
         if not os.path.exists(self.log_path):
             raise FileNotFoundError("No recommendation logs found. Run recommend_api.py first!")
 
-        # Load logs
-        self.logs_df = pd.read_csv(self.log_path)
-        
+        # Load logs (only the columns the analysis uses)
+        wanted = [c for c in ("ticket_id", "recommendations", "results") if c in table_columns(self.log_path)]
+        self.logs_df = read_table(self.log_path, columns=wanted)
+
         # Rename columns to match expected names
         self.logs_df.rename(columns={"ticket_text": "text", "recommendations": "results"}, inplace=True)
 
+        # Parquet logs keep recommendations as a nested list column
+        if is_parquet(self.log_path):
+            self.logs_df["results"] = self.logs_df["results"].apply(
+                lambda x: to_python(x) if x is not None else [])
+            print(f"Loaded {len(self.logs_df)} log entries.")
+            return
+
         # Safely evaluate the stringified Python list of dicts
         import ast
         def safe_eval(x):
@@ -93,12 +102,12 @@ class RecommendationAnalyzer:
         return low_ctr, unused
 
 
-    def save_report(self, filename="coverage_report5.csv"):
+    def save_report(self, filename="coverage_report5.parquet"):
         if self.summary_df is None:
             raise ValueError("No summary data available to save.")
 
         output_path = os.path.join(self.output_dir, filename)
-        self.summary_df.to_csv(output_path, index=False)
+        write_table(self.summary_df, output_path, schema="coverage")
         print(f"Coverage report saved at: {output_path}")
         return output_path
 
@@ -125,7 +134,7 @@ class RecommendationAnalyzer:
 
 # Example Usage
 if __name__ == "__main__":
-    analyzer = RecommendationAnalyzer(log_path="logs/recommendation_results5.csv", output_dir="logs")
+    analyzer = RecommendationAnalyzer(log_path="logs/recommendation_results5.parquet", output_dir="logs")
     results = analyzer.run_full_analysis()
 
     print("\nLow CTR Articles:")
@@ -0,0 +1,359 @@
+import os
+import time
+import pickle
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import faiss
+from src.encoders import load_encoder
+from src.intent_table import INTENT_TABLE_FILE, load_intent_table
+from src.lexical_index import BM25Index
+from src.profiling import _rss_mb
+
+DEFAULT_KB = "default"
+KB_FILES = ("article_index.faiss", "articles_meta.pkl", "article_projection.vt", "article_bm25.npz",
+            INTENT_TABLE_FILE)
+# Article metadata columns that /recommend can filter on, when present in the KB
+FILTER_COLUMNS = ("category", "product")
+
+
+def read_model_info(model_dir):
+    with open(os.path.join(model_dir, "embed_model.pkl"), "rb") as f:
+        return pickle.load(f)
+
+
+def resolve_onnx_dir(model_info, model_dir):
+    """
+    ONNX export directory of an index. Stored relative to the KB directory;
+    indexes built before that stored a path relative to the indexer's cwd.
+    """
+    onnx_dir = model_info.get("onnx_dir", "onnx")
+    if not os.path.isabs(onnx_dir):
+        in_kb_dir = os.path.join(model_dir, onnx_dir)
+        if os.path.exists(in_kb_dir) or not os.path.exists(onnx_dir):
+            onnx_dir = in_kb_dir
+    return os.path.abspath(onnx_dir)
+
+
+def encoder_spec(model_info):
+    """
+    Hashable description of the encoder an index was built with. KBs built
+    with the same model share it, wherever their ONNX export was written.
+    """
+    return (
+        model_info["model_name"],
+        model_info.get("backend", "torch"),
+        model_info.get("quantize", True),
+    )
+
+
+def _normalize_value(value):
+    return str(value).strip().lower()
+
+
+def _empty_like(index):
+    """
+    Empty index of the same type and trained state as a flat or scalar
+    quantizer index, or None for other index types.
+    """
+    if isinstance(index, faiss.IndexScalarQuantizer):
+        empty = faiss.IndexScalarQuantizer(index.d, index.sq.qtype, index.metric_type)
+        empty.sq = index.sq  # copies the trained ranges
+        empty.is_trained = True
+        return empty
+    if isinstance(index, faiss.IndexFlat):
+        return faiss.IndexFlat(index.d, index.metric_type)
+    return None
+
+
+class KnowledgeBase:
+    """
+    FAISS index, article metadata and optional projection / BM25 index of one KB.
+
+    For every value of the filter columns (e.g. category="billing") a
+    sub-index holding only those articles and a boolean mask are built at
+    load time. A single-value filter searches its sub-index, which is
+    smaller and so faster than the full index. Other filters AND the masks
+    and search the full index through a FAISS bitmap ID selector.
+    """
+
+    def __init__(self, name, model_dir, encoder, encoder_key, load_lexical=False, load_intents=False,
+                 intent_config=None):
+        self.name = name
+        self.model_dir = model_dir
+        self.encoder = encoder
+        self.encoder_key = encoder_key
+
+        model_info = read_model_info(model_dir)
+        index_path = os.path.join(model_dir, "article_index.faiss")
+        self.index_version = model_info.get(
+            "index_version", time.strftime("%Y%m%d%H%M%S", time.localtime(os.path.getmtime(index_path))))
+        self.index = faiss.read_index(index_path)
+        self.articles = pd.read_pickle(os.path.join(model_dir, "articles_meta.pkl"))
+        self.titles = self.articles["title"].tolist()
+
+        # Learned PCA/OPQ projection trained by the indexer, if any
+        projection_path = os.path.join(model_dir, "article_projection.vt")
+        self.transform = faiss.read_VectorTransform(projection_path) if os.path.exists(projection_path) else None
+
+        self.lexical_index = None
+        lexical_path = os.path.join(model_dir, "article_bm25.npz")
+        if load_lexical:
+            if os.path.exists(lexical_path):
+                self.lexical_index = BM25Index.load(lexical_path)
+            else:
+                print(f"No lexical index found at {lexical_path}. KB '{name}' falls back to dense retrieval.")
+
+        # Precomputed candidates of frequent query texts, if built for this index version and the
+        # serving settings intent_config(kb) returns
+        self.intent_table = load_intent_table(model_dir, self.index_version,
+                                              intent_config(self) if intent_config else None) if load_intents else None
+
+        self.filter_ids = {}    # column -> {value: article ids}
+        self.masks = {}         # (column, value) -> boolean mask over articles
+        self.sub_indexes = {}   # (column, value) -> (index of those articles, their ids)
+        self._build_filters()
+        self.memory_mb = None
+
+    def _build_filters(self):
+        for column in FILTER_COLUMNS:
+            if column not in self.articles.columns:
+                continue
+            values = self.articles[column].fillna("").map(_normalize_value).to_numpy()
+            groups = {value: np.flatnonzero(values == value) for value in np.unique(values) if value}
+            self.filter_ids[column] = groups
+            for value, ids in groups.items():
+                mask = np.zeros(self.index.ntotal, dtype=bool)
+                mask[ids] = True
+                self.masks[(column, value)] = mask
+
+        if not self.masks:
+            return
+        if _empty_like(self.index) is None:
+            print(f"Index of KB '{self.name}' is not flat or scalar quantized. Filters use the ID selector only.")
+            return
+        # View of the stored codes (float32 or SQ8/fp16 bytes); sub-indexes copy their rows as is
+        codes = faiss.rev_swig_ptr(self.index.codes.data(), self.index.ntotal * self.index.code_size)
+        codes = codes.reshape(self.index.ntotal, self.index.code_size)
+        for key, mask in self.masks.items():
+            ids = np.flatnonzero(mask)
+            sub_index = _empty_like(self.index)
+            sub_index.add_sa_codes(np.ascontiguousarray(codes[ids]))
+            self.sub_indexes[key] = (sub_index, ids.astype(np.int64))
+
+    def _filter_items(self, filters):
+        items = []
+        for column, wanted in filters.items():
+            if column not in self.filter_ids:
+                raise ValueError(f"KB '{self.name}' can't be filtered by '{column}'. "
+                                 f"Filterable columns: {list(self.filter_ids)}")
+            wanted = [wanted] if isinstance(wanted, str) else list(wanted)
+            items.append((column, [_normalize_value(v) for v in wanted]))
+        return items
+
+    def filter_mask(self, filters):
+        """
+        Boolean mask of the articles matching filters, a dict of column ->
+        value or list of values (any value of a column, all columns).
+        None when there are no filters.
+        """
+        if not filters:
+            return None
+        mask = np.ones(self.index.ntotal, dtype=bool)
+        for column, values in self._filter_items(filters):
+            column_mask = np.zeros(self.index.ntotal, dtype=bool)
+            for value in values:
+                if (column, value) in self.masks:
+                    column_mask |= self.masks[(column, value)]
+            mask &= column_mask
+        return mask
+
+    def search(self, query_embs, k, filters=None):
+        """FAISS search restricted to the articles matching filters. Returns (D, I)."""
+        if not filters:
+            return self.index.search(query_embs, k)
+
+        items = self._filter_items(filters)
+        if len(items) == 1 and len(items[0][1]) == 1:
+            key = (items[0][0], items[0][1][0])
+            if key not in self.masks:
+                return self._no_results(len(query_embs))
+            if key in self.sub_indexes:
+                sub_index, ids = self.sub_indexes[key]
+                D, I = sub_index.search(query_embs, k)
+                return D, np.where(I >= 0, ids[np.maximum(I, 0)], -1)
+
+        mask = self.filter_mask(filters)
+        if not mask.any():
+            return self._no_results(len(query_embs))
+        bitmap = np.packbits(mask, bitorder="little")
+        selector = faiss.IDSelectorBitmap(len(mask), faiss.swig_ptr(bitmap))
+        return self.index.search(query_embs, k, params=faiss.SearchParameters(sel=selector))
+
+    @staticmethod
+    def _no_results(num_queries):
+        return np.zeros((num_queries, 0), dtype=np.float32), np.zeros((num_queries, 0), dtype=np.int64)
+
+    def filter_memory_mb(self):
+        """Memory held by the filter masks and sub-indexes."""
+        masks = sum(mask.nbytes for mask in self.masks.values())
+        sub_indexes = sum(index.ntotal * index.code_size + ids.nbytes for index, ids in self.sub_indexes.values())
+        return (masks + sub_indexes) / 1e6
+
+    def file_size_mb(self):
+        paths = [os.path.join(self.model_dir, name) for name in KB_FILES]
+        return sum(os.path.getsize(p) for p in paths if os.path.exists(p)) / 1e6
+
+
+class IndexRegistry:
+    """
+    Named knowledge bases served by one process.
+
+    Each KB is a directory under root_dir written by KnowledgeBaseIndexer
+    (models/<kb>/article_index.faiss, ...); index files directly in root_dir
+    are the "default" KB. KBs are loaded on first use and share one encoder
+    per model. When the loaded KBs use more than memory_budget_mb (RSS
+    growth measured while loading, but at least their file size plus the
+    filter sub-indexes), the least recently used ones are unloaded; the default KB
+    is never unloaded.
+    """
+
+    def __init__(self, root_dir="models", memory_budget_mb=None, load_lexical=False,
+                 on_load=None, on_evict=None, bucketed=False, max_tokens=None, load_intents=False,
+                 intent_config=None):
+        self.root_dir = root_dir
+        self.memory_budget_mb = memory_budget_mb
+        self.load_lexical = load_lexical
+        self.on_load = on_load
+        self.on_evict = on_evict
+        self.bucketed = bucketed
+        self.max_tokens = max_tokens
+        self.load_intents = load_intents
+        self.intent_config = intent_config
+        self.loaded = OrderedDict()  # name -> KnowledgeBase, least recently used first
+        self.encoders = {}
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self._encoder_lock = threading.Lock()
+        self.paths = self.discover()
+        if not self.paths:
+            raise FileNotFoundError(f"No index found in '{root_dir}' or its subdirectories. Run `python -m src.build_index` first.")
+
+    def discover(self):
+        """Map KB names to directories containing an index."""
+        paths = {}
+        if os.path.exists(os.path.join(self.root_dir, "embed_model.pkl")):
+            paths[DEFAULT_KB] = self.root_dir
+        if os.path.isdir(self.root_dir):
+            for name in sorted(os.listdir(self.root_dir)):
+                path = os.path.join(self.root_dir, name)
+                if os.path.exists(os.path.join(path, "embed_model.pkl")):
+                    paths[name] = path
+        return paths
+
+    @property
+    def default_name(self):
+        return DEFAULT_KB if DEFAULT_KB in self.paths else next(iter(self.paths))
+
+    def names(self):
+        return list(self.paths)
+
+    def get(self, name=None):
+        """Return a loaded KB, loading it (and evicting others) if needed."""
+        name = name or self.default_name
+        with self._lock:
+            kb = self.loaded.get(name)
+            if kb is not None:
+                self.loaded.move_to_end(name)
+                return kb
+            if name not in self.paths:
+                # Pick up KBs built after startup
+                self.paths = self.discover()
+                if name not in self.paths:
+                    raise KeyError(name)
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+
+        # Load outside the registry lock so requests for other KBs aren't blocked
+        with load_lock:
+            with self._lock:
+                kb = self.loaded.get(name)
+            if kb is not None:
+                return kb
+            kb = self._load(name)
+            with self._lock:
+                self.loaded[name] = kb
+                self._evict(keep=name)
+        if self.on_load is not None:
+            self.on_load(kb)
+        return kb
+
+    def shared_onnx_dir(self, model_info, model_dir):
+        """
+        One ONNX export directory per model, under root_dir/onnx. Seeded from
+        the export the indexer wrote next to the first KB loaded, if any.
+        """
+        onnx_dir = os.path.abspath(os.path.join(self.root_dir, "onnx", model_info["model_name"].replace("/", "__")))
+        kb_onnx_dir = resolve_onnx_dir(model_info, model_dir)
+        if not os.path.exists(onnx_dir) and os.path.exists(kb_onnx_dir):
+            return kb_onnx_dir
+        return onnx_dir
+
+    def get_encoder(self, model_info, model_dir):
+        key = encoder_spec(model_info)
+        with self._encoder_lock:
+            if key not in self.encoders:
+                model_name, backend, quantize = key
+                onnx_dir = self.shared_onnx_dir(model_info, model_dir) if backend == "onnx" else None
+                self.encoders[key] = load_encoder(model_name, backend=backend, onnx_dir=onnx_dir, quantize=quantize,
+                                                  bucketed=self.bucketed, max_tokens=self.max_tokens)
+            return self.encoders[key], key
+
+    def _load(self, name):
+        model_dir = self.paths[name]
+        encoder, key = self.get_encoder(read_model_info(model_dir), model_dir)
+
+        rss_before = _rss_mb()
+        kb = KnowledgeBase(name, model_dir, encoder, key, load_lexical=self.load_lexical,
+                           load_intents=self.load_intents, intent_config=self.intent_config)
+        rss_after = _rss_mb()
+        grown = rss_after - rss_before if rss_before is not None and rss_after is not None else 0
+        # RSS growth can be hidden by memory freed during the load, so never count less than the estimate
+        kb.memory_mb = max(grown, kb.file_size_mb() + kb.filter_memory_mb())
+        print(f"Loaded KB '{name}' ({kb.index.ntotal} articles, {kb.memory_mb:.1f} MB).")
+        return kb
+
+    def memory_mb(self):
+        return sum(kb.memory_mb for kb in self.loaded.values())
+
+    def _evict(self, keep):
+        if self.memory_budget_mb is None:
+            return
+        # The default KB stays loaded; it serves requests without a kb field
+        pinned = {keep, self.default_name}
+        while self.memory_mb() > self.memory_budget_mb:
+            name = next((n for n in self.loaded if n not in pinned), None)
+            if name is None:
+                break
+            kb = self.loaded.pop(name)
+            self.evictions += 1
+            print(f"Evicted KB '{name}' to stay under {self.memory_budget_mb} MB.")
+            if self.on_evict is not None:
+                self.on_evict(kb)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "available": self.names(),
+                "loaded": {name: {"articles": kb.index.ntotal, "memory_mb": kb.memory_mb,
+                                  "index_version": kb.index_version,
+                                  "filters": {c: len(v) for c, v in kb.filter_ids.items()},
+                                  "filter_memory_mb": kb.filter_memory_mb(),
+                                  "intents": len(kb.intent_table["rows"]) if kb.intent_table else 0}
+                           for name, kb in self.loaded.items()},
+                "memory_mb": self.memory_mb(),
+                "memory_budget_mb": self.memory_budget_mb,
+                "evictions": self.evictions,
+                "encoders": len(self.encoders),
+            }
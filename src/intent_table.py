@@ -0,0 +1,202 @@
+import os
+import json
+import string
+import time
+import pickle
+import argparse
+from collections import Counter, defaultdict
+import numpy as np
+
+INTENT_TABLE_FILE = "intent_table.pkl"
+
+
+# API settings the tables are built with; they have to match the serving API's
+SERVING_ARGS = ("top_k", "retrieval_mode", "fusion", "hybrid_alpha", "candidate_k", "rerank", "rerank_model",
+                "rerank_candidates")
+
+
+def normalize_intent(text):
+    """
+    Grouping key of a ticket text when counting intents: lowercased,
+    whitespace collapsed and surrounding punctuation stripped. Digits and
+    product/error codes are kept, since they change which articles match.
+    """
+    return " ".join(str(text).lower().split()).strip(string.punctuation + " ")
+
+
+def mine_intents(log_path="logs/recommendations.jsonl", min_count=3, max_intents=1000, max_variants=5):
+    """
+    Most frequent query texts per KB in the API request log, grouped by
+    normalize_intent. Returns {kb: [(texts, count), ...]}, most frequent
+    first, where texts are the max_variants most common raw texts of the
+    intent and count is how often the intent was seen.
+    """
+    counts = defaultdict(Counter)
+    variants = defaultdict(lambda: defaultdict(Counter))
+    with open(log_path, "rb") as f:
+        for line in f:
+            try:
+                event = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if event.get("event", "impression") != "impression":
+                continue
+            text = str(event.get("query_text") or "")
+            key = normalize_intent(text)
+            if key:
+                counts[event.get("kb")][key] += 1
+                variants[event.get("kb")][key][text] += 1
+    return {kb: [([text for text, _ in variants[kb][key].most_common(max_variants)], n)
+                 for key, n in c.most_common(max_intents) if n >= min_count]
+            for kb, c in counts.items()}
+
+
+def build_intent_table(api, kb, texts, batch_size=256):
+    """
+    Candidates of each exact text with the API's own encode and search
+    path, in batches, so a hit returns what a live search would. With
+    reranking on, the stored candidates are already reranked (without a
+    latency budget) and hits skip the cross-encoder. Returns the table
+    dict saved by save_intent_table.
+    """
+    config = api.intent_config(kb)
+    top_k = config["top_k"]
+    ids = np.full((len(texts), top_k), -1, dtype=np.int32)
+    scores = np.zeros((len(texts), top_k), dtype=np.float32)
+    relevance = np.full(len(texts), np.nan, dtype=np.float32)
+    reranked = np.zeros(len(texts), dtype=np.int32)
+    for start in range(0, len(texts), batch_size):
+        chunk = texts[start:start + batch_size]
+        batch, best = api.search_batch(chunk, api.encode_queries(chunk, kb), top_k=top_k, kb=kb,
+                                       return_relevance=True)
+        for row, (text, candidates, cosine) in enumerate(zip(chunk, batch, best), start):
+            if cosine is not None:
+                relevance[row] = cosine
+            if api.reranker is not None:
+                candidates, reranked[row] = api.rerank(text, candidates[:top_k], kb)
+            for col, (idx, score) in enumerate(candidates[:top_k]):
+                ids[row, col] = idx
+                scores[row, col] = score
+    return {
+        "index_version": kb.index_version,
+        "config": config,
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "rows": {text: row for row, text in enumerate(texts)},
+        "ids": ids,
+        "scores": scores,
+        "relevance": relevance,
+        "reranked": reranked,
+    }
+
+
+def save_intent_table(table, model_dir):
+    path = os.path.join(model_dir, INTENT_TABLE_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(table, f)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_intent_table(model_dir, index_version, config=None):
+    """
+    The KB's intent table, or None if there is none, or it was built for
+    another index version or (if config is given) other serving settings.
+    """
+    path = os.path.join(model_dir, INTENT_TABLE_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        table = pickle.load(f)
+    if table.get("index_version") != index_version:
+        print(f"Ignoring stale intent table '{path}' (built for index {table.get('index_version')}, "
+              f"index is {index_version}). Rebuild it with `python -m src.intent_table`.")
+        return None
+    if config is not None and table.get("config") != config:
+        print(f"Ignoring intent table '{path}' built with other serving settings ({table.get('config')}, "
+              f"serving {config}). Rebuild it with `python -m src.intent_table` and the API's settings.")
+        return None
+    return table
+
+
+def lookup(table, text, top_k):
+    """
+    Precomputed (article_idx, score) candidates of exactly this text, its
+    best dense cosine (None if unknown) and how many candidates carry
+    cross-encoder scores, or None on a miss.
+    """
+    if table is None or top_k > table["config"]["top_k"]:
+        return None
+    row = table["rows"].get(str(text))
+    if row is None:
+        return None
+    ids, scores = table["ids"][row], table["scores"][row]
+    keep = ids >= 0
+    relevance = float(table["relevance"][row])
+    return (list(zip(ids[keep].tolist(), scores[keep].tolist())), None if np.isnan(relevance) else relevance,
+            int(table["reranked"][row]))
+
+
+def add_serving_args(parser):
+    """CLI options for the SERVING_ARGS, with the API's defaults."""
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--retrieval-mode", default="dense", choices=["dense", "hybrid"])
+    parser.add_argument("--fusion", default="rrf", choices=["rrf", "weighted"])
+    parser.add_argument("--hybrid-alpha", type=float, default=0.5)
+    parser.add_argument("--candidate-k", type=int, default=20)
+    parser.add_argument("--rerank", action="store_true", help="The API reranks with the cross-encoder.")
+    parser.add_argument("--rerank-model", default="cross-encoder/ms-marco-MiniLM-L-6-v2")
+    parser.add_argument("--rerank-candidates", type=int, default=20)
+
+
+def serving_kwargs(args):
+    return {name: getattr(args, name) for name in SERVING_ARGS}
+
+
+def rebuild_intent_tables(model_dir="models", log_path="logs/recommendations.jsonl",
+                          min_count=3, max_intents=1000, max_variants=5, **api_kwargs):
+    """
+    Mine the request log and write a fresh intent table for every KB that
+    has frequent queries. Run after re-indexing, with the serving API's
+    settings as api_kwargs; the API ignores tables whose index version or
+    settings don't match.
+    """
+    from src.recommend_api import RecommendationAPI
+
+    if not os.path.exists(log_path):
+        print(f"No request log at {log_path}. Skipping the intent tables.")
+        return {}
+    intents = mine_intents(log_path, min_count=min_count, max_intents=max_intents, max_variants=max_variants)
+    api = RecommendationAPI(model_dir=model_dir, use_intent_table=False, **api_kwargs)
+
+    paths = {}
+    for kb_name, counted in intents.items():
+        if not counted:
+            continue
+        try:
+            kb = api.get_kb(kb_name)
+        except KeyError:
+            print(f"KB '{kb_name}' from the log no longer exists. Skipping it.")
+            continue
+        texts = [text for variants, _ in counted for text in variants]
+        table = build_intent_table(api, kb, texts)
+        paths[kb.name] = save_intent_table(table, kb.model_dir)
+        seen = sum(n for _, n in counted)
+        print(f"Intent table for KB '{kb.name}': {len(texts)} texts of {len(counted)} intents seen {seen} times "
+              f"-> {paths[kb.name]}")
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute recommendations for frequent ticket texts.")
+    parser.add_argument("--model-dir", default="models")
+    parser.add_argument("--log-path", default="logs/recommendations.jsonl")
+    parser.add_argument("--min-count", type=int, default=3, help="Minimum times an intent must have been seen.")
+    parser.add_argument("--max-intents", type=int, default=1000, help="Most frequent intents kept per KB.")
+    parser.add_argument("--max-variants", type=int, default=5,
+                        help="Most common exact texts of each intent precomputed.")
+    add_serving_args(parser)
+    args = parser.parse_args()
+
+    rebuild_intent_tables(args.model_dir, args.log_path, min_count=args.min_count, max_intents=args.max_intents,
+                          max_variants=args.max_variants, **serving_kwargs(args))
@@ -0,0 +1,174 @@
+import re
+import numpy as np
+
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-_.:/][a-z0-9]+)*")
+SPLIT_PATTERN = re.compile(r"[-_.:/]")
+
+
+def tokenize(text):
+    """
+    Lowercase and split text into lexical tokens.
+
+    Compound tokens such as product codes ("SKU-1042") or error strings
+    ("ERR_TIMEOUT") are kept whole and their parts are emitted as well,
+    so both "err_timeout" and "timeout" match.
+    """
+    if not isinstance(text, str):
+        return []
+
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        tokens.append(token)
+        if SPLIT_PATTERN.search(token):
+            tokens.extend(part for part in SPLIT_PATTERN.split(token) if part)
+    return tokens
+
+
+class BM25Index:
+    """
+    A compact BM25 inverted index over a list of documents.
+
+    Posting lists are stored in CSR layout (indptr / doc_ids / weights) and
+    the BM25 term weight of every posting is precomputed at build time, so
+    scoring a query is a single weighted bincount over the postings of its
+    terms.
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.vocab = {}
+        self.indptr = None
+        self.doc_ids = None
+        self.weights = None
+        self.num_docs = 0
+
+    def build(self, texts):
+        """Tokenize documents and build the posting lists."""
+        docs = [tokenize(text) for text in texts]
+        self.num_docs = len(docs)
+
+        term_ids, doc_ids = [], []
+        for doc_id, tokens in enumerate(docs):
+            for token in tokens:
+                term_id = self.vocab.setdefault(token, len(self.vocab))
+                term_ids.append(term_id)
+                doc_ids.append(doc_id)
+
+        term_ids = np.asarray(term_ids, dtype=np.int64)
+        doc_ids = np.asarray(doc_ids, dtype=np.int64)
+        doc_len = np.bincount(doc_ids, minlength=self.num_docs).astype(np.float32)
+        avg_len = float(doc_len.mean()) if self.num_docs else 0.0
+
+        # Collapse (term, doc) pairs into term frequencies, sorted by term
+        keys, tf = np.unique(term_ids * max(self.num_docs, 1) + doc_ids, return_counts=True)
+        post_terms = keys // max(self.num_docs, 1)
+        post_docs = keys % max(self.num_docs, 1)
+
+        df = np.bincount(post_terms, minlength=len(self.vocab)).astype(np.float32)
+        idf = np.log(1.0 + (self.num_docs - df + 0.5) / (df + 0.5))
+
+        norm = self.k1 * (1.0 - self.b + self.b * doc_len[post_docs] / max(avg_len, 1e-9))
+        weights = idf[post_terms] * tf * (self.k1 + 1.0) / (tf + norm)
+
+        self.indptr = np.zeros(len(self.vocab) + 1, dtype=np.int64)
+        np.cumsum(df.astype(np.int64), out=self.indptr[1:])
+        self.doc_ids = post_docs.astype(np.int32)
+        self.weights = weights.astype(np.float32)
+
+        print(f"BM25 index built with {len(self.vocab)} terms and {len(self.doc_ids)} postings.")
+        return self
+
+    def score(self, query):
+        """Return a dense array of BM25 scores for every document."""
+        term_ids = [self.vocab[t] for t in set(tokenize(query)) if t in self.vocab]
+        if not term_ids:
+            return np.zeros(self.num_docs, dtype=np.float32)
+
+        spans = [np.arange(self.indptr[t], self.indptr[t + 1]) for t in term_ids]
+        postings = np.concatenate(spans)
+        return np.bincount(
+            self.doc_ids[postings], weights=self.weights[postings], minlength=self.num_docs
+        ).astype(np.float32)
+
+    def search(self, query, k, mask=None):
+        """
+        Return (scores, ids) of the top-k documents for the query.
+
+        Only documents with a positive score are returned. An optional
+        boolean mask restricts the candidates.
+        """
+        scores = self.score(query)
+        if mask is not None:
+            scores = np.where(mask, scores, 0.0)
+
+        hits = np.flatnonzero(scores > 0)
+        if len(hits) > k:
+            hits = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        hits = hits[np.argsort(-scores[hits], kind="stable")]
+        return scores[hits], hits
+
+    def save(self, path):
+        """Save the index as an uncompressed .npz file."""
+        terms = np.empty(len(self.vocab), dtype=object)
+        for term, term_id in self.vocab.items():
+            terms[term_id] = term
+
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                terms=terms.astype(str),
+                indptr=self.indptr,
+                doc_ids=self.doc_ids,
+                weights=self.weights,
+                params=np.array([self.k1, self.b, self.num_docs], dtype=np.float64),
+            )
+
+    @classmethod
+    def load(cls, path):
+        """Load an index previously written by save()."""
+        with np.load(path, allow_pickle=False) as data:
+            k1, b, num_docs = data["params"]
+            index = cls(k1=float(k1), b=float(b))
+            index.num_docs = int(num_docs)
+            index.vocab = {term: i for i, term in enumerate(data["terms"].tolist())}
+            index.indptr = data["indptr"]
+            index.doc_ids = data["doc_ids"]
+            index.weights = data["weights"]
+        return index
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """
+    Fuse several ranked lists of document ids with reciprocal rank fusion.
+
+    Returns a list of (doc_id, score) sorted by descending fused score.
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            fused[int(doc_id)] = fused.get(int(doc_id), 0.0) + 1.0 / (k + rank + 1)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+
+def weighted_fusion(dense, lexical, alpha=0.5):
+    """
+    Fuse dense and lexical (ids, scores) results by a weighted sum of
+    min-max normalized scores. alpha is the weight of the dense side.
+    """
+    def normalize(ids, scores):
+        scores = np.asarray(scores, dtype=np.float32)
+        if len(scores) == 0:
+            return {}
+        low, high = float(scores.min()), float(scores.max())
+        span = high - low if high > low else 1.0
+        return {int(i): (float(s) - low) / span if high > low else 1.0 for i, s in zip(ids, scores)}
+
+    dense_norm = normalize(*dense)
+    lexical_norm = normalize(*lexical)
+
+    fused = {}
+    for doc_id in set(dense_norm) | set(lexical_norm):
+        fused[doc_id] = alpha * dense_norm.get(doc_id, 0.0) + (1 - alpha) * lexical_norm.get(doc_id, 0.0)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,113 @@
+import time
+import threading
+from collections import OrderedDict, deque
+import numpy as np
+
+# Degradation tiers, from full service to rejecting every request
+TIERS = ("normal", "reduced", "memo_only", "reject")
+
+
+def memo_key(kb_name, index_version, ticket_text, filters=None):
+    """
+    Response memo key: KB and its index version (so answers from a replaced
+    index are never served), whitespace/case-normalized text and filters.
+    """
+    filters_key = tuple(sorted((k, str(v)) for k, v in filters.items())) if filters else ()
+    return kb_name, index_version, " ".join(str(ticket_text).lower().split()), filters_key
+
+
+class LoadShedder:
+    """
+    Picks a degradation tier for each /recommend request from the number
+    of requests in flight and the recent request latency:
+
+    - normal: the full pipeline
+    - reduced: no reranking, only reduced_top_k results, and a minimal
+      impression log line (titles only, enough to match clicks)
+    - memo_only: only answers already in the response memo are served;
+      other requests get 503 with Retry-After
+    - reject: every request gets 503 with Retry-After
+
+    in_flight_thresholds and latency_thresholds_ms are the in-flight count
+    and p95 latency at which reduced, memo_only and reject start (None
+    turns a tier off for that signal); the higher tier of the two wins.
+    Latency is taken over the last window_s seconds of requests that ran
+    the search, so once those age out the tier steps back down.
+    """
+
+    def __init__(self, in_flight_thresholds=(8, 16, 32), latency_thresholds_ms=(250, 500, 1000),
+                 window_s=10.0, min_samples=20, refresh_s=0.5, reduced_top_k=1,
+                 memo_size=4096, retry_after_s=1):
+        self.in_flight_thresholds = in_flight_thresholds
+        self.latency_thresholds_ms = latency_thresholds_ms
+        self.window_s = window_s
+        self.min_samples = min_samples
+        self.refresh_s = refresh_s
+        self.reduced_top_k = reduced_top_k
+        self.memo_size = memo_size
+        self.retry_after_s = retry_after_s
+        self._latencies = deque()  # (timestamp, seconds) of recent searched requests
+        self._latency_lock = threading.Lock()
+        self._latency_level = 0
+        self._p95_ms = None
+        self._refreshed = 0.0
+        self._memo = OrderedDict()
+        self._memo_lock = threading.Lock()
+
+    @staticmethod
+    def _level(value, thresholds):
+        level = 0
+        for i, threshold in enumerate(thresholds or ()):
+            if threshold is not None and value >= threshold:
+                level = i + 1
+        return level
+
+    def observe(self, latency_s):
+        """Record the latency of a request that ran the search."""
+        with self._latency_lock:
+            self._latencies.append((time.monotonic(), latency_s))
+
+    def _refresh_latency(self, now):
+        # The p95 is recomputed at most every refresh_s, not on every request
+        with self._latency_lock:
+            if now - self._refreshed < self.refresh_s:
+                return
+            self._refreshed = now
+            while self._latencies and self._latencies[0][0] < now - self.window_s:
+                self._latencies.popleft()
+            if len(self._latencies) < self.min_samples:
+                self._p95_ms = None
+                self._latency_level = 0
+                return
+            self._p95_ms = float(np.percentile([s for _, s in self._latencies], 95)) * 1000
+            self._latency_level = self._level(self._p95_ms, self.latency_thresholds_ms)
+
+    def tier(self, in_flight):
+        """Degradation tier for a request arriving with in_flight requests in progress."""
+        self._refresh_latency(time.monotonic())
+        return TIERS[max(self._level(in_flight, self.in_flight_thresholds), self._latency_level)]
+
+    def remember(self, key, recommendations):
+        if not self.memo_size:
+            return
+        with self._memo_lock:
+            self._memo[key] = recommendations
+            self._memo.move_to_end(key)
+            if len(self._memo) > self.memo_size:
+                self._memo.popitem(last=False)
+
+    def recall(self, key):
+        """Memoized recommendations for key, or None."""
+        with self._memo_lock:
+            recommendations = self._memo.get(key)
+            if recommendations is not None:
+                self._memo.move_to_end(key)
+            return recommendations
+
+    def stats(self):
+        return {
+            "latency_p95_ms": self._p95_ms,
+            "latency_tier": TIERS[self._latency_level],
+            "latency_samples": len(self._latencies),
+            "memo_entries": len(self._memo),
+        }
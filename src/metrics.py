@@ -0,0 +1,149 @@
+import time
+import bisect
+import threading
+
+
+# Latency buckets in seconds, from 0.5 ms to 5 s
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+class Counter:
+    """Monotonic counter, optionally split by a fixed set of labels."""
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, value=1, **labels):
+        key = tuple((name, labels[name]) for name in self.labelnames)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + value
+
+    def get(self, **labels):
+        return self.values.get(tuple((name, labels[name]) for name in self.labelnames), 0)
+
+    def render(self):
+        # Copy under the lock: inc() with a new label set would resize the dict mid-iteration
+        with self._lock:
+            items = sorted(self.values.items())
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    """Value that can go up and down."""
+
+    def set(self, value, **labels):
+        key = tuple((name, labels[name]) for name in self.labelnames)
+        with self._lock:
+            self.values[key] = value
+
+    def dec(self, value=1, **labels):
+        self.inc(-value, **labels)
+
+    def render(self):
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram. Bucket arrays are preallocated per label value
+    so observe() is a bisect and three increments under a lock.
+    """
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS, labelname=None, labelvalues=()):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.labelname = labelname
+        self.series = {}
+        self._lock = threading.Lock()
+        for value in labelvalues:
+            self._series(value)
+
+    def _series(self, labelvalue):
+        series = self.series.get(labelvalue)
+        if series is None:
+            series = self.series[labelvalue] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+        return series
+
+    def observe(self, value, labelvalue=None):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series(labelvalue)
+            series["counts"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self):
+        with self._lock:
+            snapshot = [(labelvalue, {"counts": list(series["counts"]), "sum": series["sum"], "count": series["count"]})
+                        for labelvalue, series in self.series.items()]
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labelvalue, series in snapshot:
+            base = [(self.labelname, labelvalue)] if self.labelname else []
+            cumulative = 0
+            for bound, count in zip(self.buckets, series["counts"]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(base + [('le', bound)])} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(base + [('le', '+Inf')])} {series['count']}")
+            lines.append(f"{self.name}_sum{_format_labels(base)} {series['sum']}")
+            lines.append(f"{self.name}_count{_format_labels(base)} {series['count']}")
+        return lines
+
+
+class StageTimer:
+    """Context manager that records the elapsed monotonic time of a stage."""
+
+    __slots__ = ("histogram", "stage", "start")
+
+    def __init__(self, histogram, stage):
+        self.histogram = histogram
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, self.stage)
+        return False
+
+
+class MetricsRegistry:
+    """Holds metrics and renders them in the Prometheus text format."""
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self.register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self.register(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS, labelname=None, labelvalues=()):
+        return self.register(Histogram(name, help_text, buckets, labelname, labelvalues))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
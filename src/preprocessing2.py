@@ -1,12 +1,13 @@
 import re
 import pandas as pd
+from src.storage import read_table, write_table
 
 class TicketProcessor:
     def __init__(self, input_file=None, output_file=None, df=None):
         if df is not None:
             self.df = df  # Use the provided DataFrame directly
         elif input_file is not None:
-            self.df = pd.read_csv(input_file)  # Read from file if passed
+            self.df = read_table(input_file)  # Read from file (CSV or Parquet) if passed
         else:
             raise ValueError("Either 'df' or 'input_file' must be provided.")
         
@@ -15,11 +16,15 @@ class TicketProcessor:
     def clean_text(self, text):
         return re.sub(r"[^a-zA-Z\s]", "", text.lower()).strip()
 
-    def process_and_save(self):
+    def process(self):
         self.df["clean_text"] = self.df["ticket_text"].apply(self.clean_text)
-        self.df.to_csv(self.output_file, index=False)
+        return self.df
+
+    def process_and_save(self):
+        self.process()
+        write_table(self.df, self.output_file, schema="preprocessed")
 
 if __name__ == "__main__":
-    processor = TicketProcessor("data/raw/tickets6.csv", "data/processed/preprocessed_tickets6.csv")
+    processor = TicketProcessor("data/raw/tickets6.csv", "data/processed/preprocessed_tickets6.parquet")
     processor.process_and_save()
     print(f"Preprocessed data saved to '{processor.output_file}'.")
@@ -0,0 +1,131 @@
+import os
+import sys
+import json
+import time
+import pstats
+import cProfile
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+def _rss_mb():
+    """Current resident set size in MB, if it can be measured."""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / 1e6
+    return None
+
+
+def _peak_rss_mb():
+    """Process high-water mark RSS in MB, if it can be measured."""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports KB, macOS reports bytes
+        return peak / 1e6 if sys.platform == "darwin" else peak / 1e3
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / 1e6
+    return None
+
+
+class PipelineProfiler:
+    """
+    Records wall time, CPU time, peak RSS and rows/sec for each stage of an
+    offline pipeline run, and writes the results as a JSON run report.
+
+    If profile_stage names a stage, that stage also runs under cProfile and
+    its stats are dumped to profile_dir (<stage>.prof, loadable with pstats
+    or snakeviz, plus a plain-text summary of the top functions). The
+    process id is recorded in the report so py-spy can be attached to a
+    long-running stage.
+    """
+
+    def __init__(self, run_name="offline_pipeline", report_dir="logs/run_reports",
+                 profile_stage=None, profile_dir="logs/profiles"):
+        self.run_name = run_name
+        self.report_dir = report_dir
+        self.profile_stage = profile_stage
+        self.profile_dir = profile_dir
+        self.started_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name, rows=None):
+        """
+        Time a block of code as a pipeline stage. The yielded record can be
+        updated inside the block, e.g. record["rows"] = len(df).
+        """
+        record = {"stage": name, "rows": rows, "status": "ok"}
+        profiler = cProfile.Profile() if name == self.profile_stage else None
+        rss_before = _rss_mb()
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield record
+        except Exception as e:
+            record["status"] = "error"
+            record["error"] = str(e)
+            raise
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                record["profile"] = self._dump_profile(name, profiler)
+
+            wall = time.perf_counter() - wall_start
+            rss_after = _rss_mb()
+            record.update({
+                "wall_s": wall,
+                "cpu_s": time.process_time() - cpu_start,
+                "peak_rss_mb": _peak_rss_mb(),
+                "rss_delta_mb": rss_after - rss_before if rss_after is not None else None,
+                "rows_per_s": record["rows"] / wall if record["rows"] and wall > 0 else None,
+            })
+            self.stages.append(record)
+            print(f"[{name}] {record['status']} in {wall:.2f}s (cpu {record['cpu_s']:.2f}s)")
+
+    def wrap(self, name, func, *args, rows=None, **kwargs):
+        """
+        Run func(*args, **kwargs) as a stage. rows may be a number or a
+        callable that receives the result and returns the row count.
+        """
+        with self.stage(name) as record:
+            result = func(*args, **kwargs)
+            record["rows"] = rows(result) if callable(rows) else rows
+        return result
+
+    def _dump_profile(self, name, profiler):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        prof_path = os.path.join(self.profile_dir, f"{name}.prof")
+        text_path = os.path.join(self.profile_dir, f"{name}.txt")
+        profiler.dump_stats(prof_path)
+        with open(text_path, "w") as f:
+            pstats.Stats(profiler, stream=f).sort_stats("cumulative").print_stats(40)
+        print(f"Profile for stage '{name}' saved to {prof_path}")
+        return prof_path
+
+    def report(self):
+        return {
+            "run": self.run_name,
+            "pid": os.getpid(),
+            "started_at": self.started_at,
+            "total_wall_s": sum(s["wall_s"] for s in self.stages),
+            "stages": self.stages,
+        }
+
+    def save_report(self):
+        os.makedirs(self.report_dir, exist_ok=True)
+        path = os.path.join(self.report_dir, f"{self.run_name}_{time.strftime('%Y%m%d-%H%M%S')}.json")
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2, default=str)
+        print(f"Run report saved to: {path}")
+        return path
@@ -1,64 +1,545 @@
-from fastapi import FastAPI
+from collections import OrderedDict
+from typing import Dict, List, Optional, Union
+from fastapi import FastAPI, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response
 from pydantic import BaseModel
-from sentence_transformers import SentenceTransformer
-import pandas as pd, faiss, pickle, os
+from src.index_registry import IndexRegistry
+from src.lexical_index import reciprocal_rank_fusion, weighted_fusion
+from src.load_shedding import LoadShedder, TIERS, memo_key
+from src.intent_table import lookup as intent_lookup
+from src.metrics import MetricsRegistry, StageTimer
+import pandas as pd, faiss, os, time, json, threading
+
+
+STAGES = ("validation", "encode", "search", "rerank", "metadata", "serialization", "logging")
+# recommend_requests_total status of each /recommend response code; anything else is "error"
+RESPONSE_STATUS = {200: "ok", 404: "invalid", 422: "invalid", 503: "shed"}
 
 
 class Ticket(BaseModel):
     ticket_id: str
     ticket_text: str
-    
+    kb: Optional[str] = None  # knowledge base to search; the default KB if omitted
+    # Restrict to articles whose metadata matches, e.g. {"category": "Billing"}
+    filters: Optional[Dict[str, Union[str, List[str]]]] = None
+
+
+class Feedback(BaseModel):
+    ticket_id: str
+    article_title: str
+
 
 class RecommendationAPI:
-    def __init__(self, model_dir="models", log_dir="logs", top_k=3):
+    def __init__(self, model_dir="models", log_dir="logs", top_k=3,
+                 retrieval_mode="dense", fusion="rrf", hybrid_alpha=0.5, candidate_k=20,
+                 rerank=False, rerank_model="cross-encoder/ms-marco-MiniLM-L-6-v2",
+                 rerank_candidates=20, rerank_budget_ms=150, cache_size=1024,
+                 memory_budget_mb=None, bucketed_encoder=False, max_tokens=None,
+                 load_shedding=False, shed_in_flight=(8, 16, 32), shed_latency_ms=(250, 500, 1000),
+                 reduced_top_k=1, retry_after_s=1, use_intent_table=True):
         self.model_dir = model_dir
         self.log_dir = log_dir
         self.top_k = top_k
-        self.model, self.articles, self.index = self._load_resources()
+        self.retrieval_mode = retrieval_mode
+        self.fusion = fusion
+        self.hybrid_alpha = hybrid_alpha
+        self.candidate_k = candidate_k
+        self.rerank_candidates = rerank_candidates
+        self.rerank_budget_ms = rerank_budget_ms
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.log_path = os.path.join(log_dir, "recommendations.jsonl")
+        self._log_file = None
+        self._log_lock = threading.Lock()
+        self._setup_metrics()
+        # Loaded before the KBs, whose intent tables are checked against the rerank setting
+        self.reranker = self._load_reranker(rerank_model) if rerank else None
+        # Knowledge bases under model_dir, sharing one encoder per model
+        self.registry = IndexRegistry(model_dir, memory_budget_mb=memory_budget_mb,
+                                      load_lexical=retrieval_mode == "hybrid",
+                                      on_load=self._on_kb_loaded, on_evict=self._on_kb_evicted,
+                                      bucketed=bucketed_encoder, max_tokens=max_tokens,
+                                      load_intents=use_intent_table, intent_config=self.intent_config)
+        self.default_kb = self.registry.get()
+        # Degrades /recommend under overload instead of slowing down every request
+        self.shedder = LoadShedder(in_flight_thresholds=shed_in_flight, latency_thresholds_ms=shed_latency_ms,
+                                   reduced_top_k=reduced_top_k, retry_after_s=retry_after_s) if load_shedding else None
         self.app = FastAPI(title="Real-Time Recommendation Engine")
         self._setup_routes()
 
-    def _load_resources(self):
-        with open(os.path.join(self.model_dir, "embed_model.pkl"), "rb") as f:
-            model_info = pickle.load(f)
-        model = SentenceTransformer(model_info["model_name"])
-        articles = pd.read_pickle(os.path.join(self.model_dir, "articles_meta.pkl"))
-        index = faiss.read_index(os.path.join(self.model_dir, "article_index.faiss"))
-        return model, articles, index
+    def _setup_metrics(self):
+        self.metrics = MetricsRegistry()
+        self.requests_total = self.metrics.counter(
+            "recommend_requests_total", "Recommendation requests by status.", ["status"])
+        self.request_latency = self.metrics.histogram(
+            "recommend_request_latency_seconds", "End-to-end /recommend handler latency.")
+        self.stage_latency = self.metrics.histogram(
+            "recommend_stage_latency_seconds", "Latency of each /recommend stage.",
+            labelname="stage", labelvalues=STAGES)
+        self.in_flight = self.metrics.gauge(
+            "recommend_in_flight_requests", "Requests currently being processed.")
+        self.batch_size = self.metrics.histogram(
+            "recommend_encode_batch_size", "Number of texts per encoder call.",
+            buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+        self.cache_requests = self.metrics.counter(
+            "recommend_cache_requests_total", "Query embedding cache lookups.", ["result"])
+        self.intent_requests = self.metrics.counter(
+            "recommend_intent_table_requests_total", "Precomputed intent table lookups.", ["result"])
+        self.index_info = self.metrics.gauge(
+            "recommend_index_info", "Loaded index version and size.", ["kb", "version"])
+        self.kb_memory = self.metrics.gauge(
+            "recommend_kb_memory_mb", "Memory attributed to each loaded knowledge base.", ["kb"])
+        self.rerank_stats = self.metrics.gauge(
+            "recommend_rerank_stats", "Cross-encoder rerank counters and average added latency.", ["stat"])
+        self.load_tier = self.metrics.gauge(
+            "recommend_load_tier", "Degradation tier of the last request (0=normal, 1=reduced, 2=memo_only, 3=reject).")
+        self.tier_requests = self.metrics.counter(
+            "recommend_tier_requests_total", "Requests by degradation tier and outcome.", ["tier", "outcome"])
 
-    def _setup_routes(self):
-        @self.app.get("/")
-        def root():
-            return {"message": "API is running!"}
+    def stage(self, name):
+        return StageTimer(self.stage_latency, name)
+
+    def _on_kb_loaded(self, kb):
+        self.index_info.set(kb.index.ntotal, kb=kb.name, version=kb.index_version)
+        self.kb_memory.set(kb.memory_mb, kb=kb.name)
+
+    def _on_kb_evicted(self, kb):
+        self.index_info.set(0, kb=kb.name, version=kb.index_version)
+        self.kb_memory.set(0, kb=kb.name)
+
+    def get_kb(self, name=None):
+        """Loaded KnowledgeBase by name (the default KB if None). KeyError if unknown."""
+        if name is None or name == self.default_kb.name:
+            return self.default_kb
+        return self.registry.get(name)
+
+    # Default KB resources, as served before multi-KB support
+    @property
+    def model(self):
+        return self.default_kb.encoder
+
+    @property
+    def articles(self):
+        return self.default_kb.articles
+
+    @property
+    def index(self):
+        return self.default_kb.index
 
-        @self.app.post("/recommend")
-        def recommend(ticket: Ticket):
-            query_emb = self.model.encode([ticket.ticket_text], convert_to_numpy=True)
+    @property
+    def titles(self):
+        return self.default_kb.titles
+
+    @property
+    def index_version(self):
+        return self.default_kb.index_version
+
+    def _load_reranker(self, rerank_model):
+        # Imported here so the cross-encoder stack is only loaded when reranking is enabled
+        from src.reranker import CrossEncoderReranker
+        return CrossEncoderReranker(rerank_model)
+
+    def _embed(self, texts, kb):
+        self.batch_size.observe(len(texts))
+        query_emb = kb.encoder.encode(texts, convert_to_numpy=True).astype("float32")
+        faiss.normalize_L2(query_emb)
+        return query_emb
+
+    def _project(self, query_emb, kb):
+        if kb.transform is not None:
+            query_emb = kb.transform.apply(query_emb)
             faiss.normalize_L2(query_emb)
-            D, I = self.index.search(query_emb, self.top_k)
+        return query_emb
+
+    def encode_queries(self, texts, kb=None):
+        kb = kb or self.default_kb
+        return self._project(self._embed(texts, kb), kb)
+
+    def encode_query(self, text, kb=None):
+        """Encode a single query, using the LRU embedding cache."""
+        kb = kb or self.default_kb
+        # Keyed by encoder, so KBs built with the same model share cached embeddings
+        key = (kb.encoder_key, text)
+        with self._cache_lock:
+            query_emb = self._cache.get(key)
+            if query_emb is not None:
+                self._cache.move_to_end(key)
+        if query_emb is not None:
+            self.cache_requests.inc(result="hit")
+            return self._project(query_emb, kb)
+
+        self.cache_requests.inc(result="miss")
+        query_emb = self._embed([text], kb)
+        if self.cache_size:
+            with self._cache_lock:
+                self._cache[key] = query_emb
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return self._project(query_emb, kb)
+
+    def intent_config(self, kb):
+        """Serving settings a KB's intent table must have been built with (see load_intent_table)."""
+        hybrid = self._first_stage_scorer(kb) != "dense"
+        return {
+            "retrieval_mode": "hybrid" if hybrid else "dense",
+            "fusion": self.fusion if hybrid else None,
+            "hybrid_alpha": self.hybrid_alpha if hybrid and self.fusion == "weighted" else None,
+            "candidate_k": self.candidate_k if hybrid else None,
+            "top_k": self._candidate_k(),
+            "rerank": self.reranker.model_name if self.reranker is not None else None,
+        }
+
+    def _intent_candidates(self, text, kb, top_k, filters=None):
+        """
+        Precomputed (candidates, relevance, reranked) of a frequent ticket
+        text, or None (filtered queries always search).
+        """
+        if kb.intent_table is None or filters:
+            return None
+        hit = intent_lookup(kb.intent_table, text, top_k)
+        self.intent_requests.inc(result="miss" if hit is None else "hit")
+        return hit
+
+    def search_batch(self, texts, query_embs, top_k=None, kb=None, filters=None, return_relevance=False):
+        """
+        Return a list of (article_idx, score) candidates for each query,
+        only from articles matching filters if given. With return_relevance,
+        also return each query's best dense cosine score (None if nothing
+        matched), which unlike fused or reranked scores is comparable across
+        retrieval modes.
+        """
+        kb = kb or self.default_kb
+        top_k = top_k or self.top_k
+        hybrid = self.retrieval_mode == "hybrid" and kb.lexical_index is not None
+        k = max(self.candidate_k, top_k) if hybrid else top_k
+
+        # One FAISS call for the whole batch
+        D, I = kb.search(query_embs, k, filters)
+        mask = kb.filter_mask(filters) if hybrid else None
+
+        batch = []
+        relevance = [float(s[0]) if len(s) and i[0] >= 0 else None for s, i in zip(D, I)]
+        for text, scores, ids in zip(texts, D, I):
+            keep = ids >= 0
+            scores, ids = scores[keep], ids[keep]
+            if not hybrid:
+                batch.append(list(zip(ids.tolist(), scores.tolist())))
+                continue
+
+            lexical = kb.lexical_index.search(text, k, mask=mask)
+            if self.fusion == "weighted":
+                fused = weighted_fusion((ids, scores), (lexical[1], lexical[0]), alpha=self.hybrid_alpha)
+            else:
+                fused = reciprocal_rank_fusion([ids, lexical[1]])
+            batch.append(fused[:top_k])
+        return (batch, relevance) if return_relevance else batch
+
+    def search(self, text, top_k=None, query_emb=None, kb=None, filters=None):
+        """Return a list of (article_idx, score) for the query text."""
+        kb = kb or self.default_kb
+        if query_emb is None:
+            query_emb = self.encode_query(text, kb)
+        return self.search_batch([text], query_emb, top_k, kb, filters)[0]
+
+    def rerank(self, ticket_text, candidates, kb, start=None):
+        """
+        Cross-encoder rerank of candidates within what is left of the budget
+        of a request started at start (no budget if None). Returns the
+        candidates and how many of them were reranked.
+        """
+        remaining_ms = None if start is None else self.rerank_budget_ms - (time.perf_counter() - start) * 1000
+        passages = kb.articles["text"].iloc[[idx for idx, _ in candidates]].tolist()
+        return self.reranker.rerank(ticket_text, candidates, passages, remaining_ms)
+
+    def _first_stage_scorer(self, kb):
+        """Which scorer produced the search scores: "dense", or the fusion method in hybrid mode."""
+        if self.retrieval_mode == "hybrid" and kb.lexical_index is not None:
+            return self.fusion
+        return "dense"
+
+    def _candidate_k(self):
+        return self.top_k if self.reranker is None else max(self.rerank_candidates, self.top_k)
+
+    def _build_response(self, ticket_id, ticket_text, candidates, start, kb, tier="normal", relevance=None,
+                        reranked=None):
+        # Shed tiers skip reranking and full logging; "reduced" also returns fewer results.
+        # reranked is set for intent table hits, whose candidates were reranked when the table was built.
+        shed = tier != "normal"
+        top_k = min(self.top_k, self.shedder.reduced_top_k) if tier == "reduced" else self.top_k
+        if reranked is None:
+            reranked = 0
+            if self.reranker is not None and not shed:
+                with self.stage("rerank"):
+                    candidates, reranked = self.rerank(ticket_text, candidates, kb, start)
+
+        # Scores of different scorers are on different scales, so each result says which one it has
+        first_stage = self._first_stage_scorer(kb)
+        with self.stage("metadata"):
             results = [
                 {
                     "rank": i + 1,
-                    "article_title": self.articles.iloc[idx]["title"],
-                    "score": float(D[0][i]),
+                    "article_title": kb.titles[idx],
+                    "score": float(score),
+                    "scorer": "cross_encoder" if i < reranked else first_stage,
                 }
-                for i, idx in enumerate(I[0])
+                for i, (idx, score) in enumerate(candidates[:top_k])
             ]
-            os.makedirs(self.log_dir, exist_ok=True)
-            pd.DataFrame([{
-                "ticket_id": ticket.ticket_id,
-                "query_text": ticket.ticket_text,
+
+        self._log_impression(ticket_id, ticket_text, kb, results, tier, relevance)
+        return {"ticket_id": ticket_id, "ticket_text": ticket_text, "kb": kb.name, "tier": tier,
+                "recommendations": results}
+
+    def _log_impression(self, ticket_id, ticket_text, kb, results, tier="normal", relevance=None):
+        with self.stage("logging"):
+            if tier != "normal":
+                # Shed tiers log only titles, so clicks on these responses still match an impression
+                self.log_event({
+                    "event": "impression",
+                    "ticket_id": ticket_id,
+                    "kb": kb.name,
+                    "tier": tier,
+                    "results": [{"article_title": r["article_title"]} for r in results],
+                })
+                return
+            event = {
+                "event": "impression",
+                "ticket_id": ticket_id,
+                "kb": kb.name,
+                "query_text": ticket_text,
                 "results": results,
-            }])
-            return {"ticket_id": ticket.ticket_id, "ticket_text": ticket.ticket_text, "recommendations": results}
+            }
+            if relevance is not None:
+                event["relevance"] = relevance  # best dense cosine, used for zero-hit alerting
+            self.log_event(event)
+
+    def log_event(self, event):
+        """Append an event to the JSON lines request log read by the alert evaluator."""
+        event = {"ts": time.time(), **event}
+        line = json.dumps(event) + "\n"
+        with self._log_lock:
+            if self._log_file is None:
+                os.makedirs(self.log_dir, exist_ok=True)
+                self._log_file = open(self.log_path, "a", buffering=1)
+            self._log_file.write(line)
+
+    def recommend(self, ticket_id, ticket_text, kb=None, filters=None, tier="normal"):
+        """
+        Recommend articles for one ticket. Texts in the KB's intent table
+        skip encoding, search and reranking. tier "reduced" skips reranking, returns
+        fewer results and logs a minimal impression (see LoadShedder).
+        """
+        start = time.perf_counter()
+        kb = self.get_kb(kb)
+        top_k = self.top_k if tier == "reduced" else self._candidate_k()
+        reranked = None
+        hit = self._intent_candidates(ticket_text, kb, top_k, filters)
+        if hit is not None:
+            candidates, relevance, reranked = hit
+        else:
+            with self.stage("encode"):
+                query_emb = self.encode_query(ticket_text, kb)
+
+            with self.stage("search"):
+                batch, relevance = self.search_batch([ticket_text], query_emb, top_k, kb, filters,
+                                                     return_relevance=True)
+                candidates, relevance = batch[0], relevance[0]
+
+        return self._build_response(ticket_id, ticket_text, candidates, start, kb, tier, relevance, reranked)
+
+    def _shed(self, tier):
+        return HTTPException(status_code=503, detail=f"Overloaded (tier '{tier}'). Retry later.",
+                             headers={"Retry-After": str(self.shedder.retry_after_s)})
+
+    def recommend_batch(self, tickets, batch_size=64):
+        """
+        Recommend articles for many tickets in-process, encoding and
+        searching each chunk of batch_size tickets in a single call.
+        tickets is a list of dicts with ticket_id, ticket_text and
+        optionally kb and filters; responses are returned in input order.
+        Each ticket gets its own rerank budget, charged its share of the
+        batched encode and search.
+        Tickets for an unknown KB or with invalid filters get a response
+        with an "error" and no recommendations instead of failing the batch.
+        """
+        groups = {}
+        for i, t in enumerate(tickets):
+            kb, filters = t.get("kb"), t.get("filters")
+            filters = filters if isinstance(filters, dict) and filters else None
+            key = (None if pd.isna(kb) else kb, json.dumps(filters, sort_keys=True) if filters else None)
+            groups.setdefault(key, []).append(i)
+
+        responses = [None] * len(tickets)
+        for (kb_name, filters_key), positions in groups.items():
+            filters = json.loads(filters_key) if filters_key else None
+            try:
+                kb = self.get_kb(kb_name)  # loads the KB on first use
+                if filters:
+                    kb.filter_mask(filters)
+            except (KeyError, ValueError) as e:
+                error = (f"Unknown knowledge base '{kb_name}'. Available: {self.registry.names()}"
+                         if isinstance(e, KeyError) else str(e))
+                for i in positions:
+                    responses[i] = {"ticket_id": str(tickets[i].get("ticket_id")),
+                                    "ticket_text": tickets[i].get("ticket_text"),
+                                    "kb": kb_name or self.default_kb.name, "recommendations": [], "error": error}
+                continue
+            for offset in range(0, len(positions), batch_size):
+                chunk = positions[offset:offset + batch_size]
+                ids = [str(tickets[i].get("ticket_id")) for i in chunk]
+                texts = ["" if pd.isna(tickets[i].get("ticket_text")) else str(tickets[i].get("ticket_text"))
+                         for i in chunk]
+
+                start = time.perf_counter()
+                hits = [self._intent_candidates(text, kb, self._candidate_k(), filters) for text in texts]
+                batch = [hit[0] if hit else None for hit in hits]
+                relevance = [hit[1] if hit else None for hit in hits]
+                reranked = [hit[2] if hit else None for hit in hits]
+                misses = [j for j, hit in enumerate(hits) if hit is None]
+                if misses:
+                    miss_texts = [texts[j] for j in misses]
+                    with self.stage("encode"):
+                        query_embs = self.encode_queries(miss_texts, kb)
+                    with self.stage("search"):
+                        searched, best = self.search_batch(miss_texts, query_embs, top_k=self._candidate_k(),
+                                                           kb=kb, filters=filters, return_relevance=True)
+                    for j, candidates, score in zip(misses, searched, best):
+                        batch[j], relevance[j] = candidates, score
+
+                # Each ticket's rerank budget is charged only its share of the batched encode and search,
+                # like a single /recommend call, not the whole chunk's or the previous tickets' reranks
+                share = (time.perf_counter() - start) / len(chunk)
+                for i, ticket_id, text, candidates, score, n in zip(chunk, ids, texts, batch, relevance, reranked):
+                    responses[i] = self._build_response(ticket_id, text, candidates, time.perf_counter() - share, kb,
+                                                        relevance=score, reranked=n)
+        return responses
+
+    def render_metrics(self):
+        if self.reranker is not None:
+            for stat, value in self.reranker.get_stats().items():
+                self.rerank_stats.set(value, stat=stat)
+        return self.metrics.render()
+
+    def _setup_routes(self):
+        @self.app.get("/")
+        def root():
+            return {"message": "API is running!"}
+
+        @self.app.middleware("http")
+        async def track_recommend(request: Request, call_next):
+            # Counted on arrival, so requests still waiting for a threadpool worker are in flight too
+            if request.url.path != "/recommend":
+                return await call_next(request)
+            arrival = time.perf_counter()
+            self.in_flight.inc()
+            status = "error"
+            tier = self.shedder.tier(self.in_flight.get()) if self.shedder else "normal"
+            self.load_tier.set(TIERS.index(tier))
+            request.state.tier = tier
+            request.state.arrival = arrival
+            try:
+                if tier == "reject":
+                    # Rejected before the body is read or a worker is taken
+                    shed = self._shed(tier)
+                    response = JSONResponse({"detail": shed.detail}, status_code=shed.status_code,
+                                            headers=shed.headers)
+                else:
+                    response = await call_next(request)
+                status = RESPONSE_STATUS.get(response.status_code, "error")
+                return response
+            finally:
+                self.in_flight.dec()
+                self.requests_total.inc(status=status)
+                self.tier_requests.inc(tier=tier, outcome=status)
+                self.request_latency.observe(time.perf_counter() - arrival)
+
+        async def validation_start(request: Request):
+            # Route dependencies run after the body is read and before it is validated into a Ticket
+            request.state.start = time.perf_counter()
+
+        @self.app.post("/recommend", dependencies=[Depends(validation_start)])
+        async def recommend(ticket: Ticket, request: Request):
+            # Async, so it starts right after validation; the search runs in the threadpool
+            start = request.state.start
+            self.stage_latency.observe(time.perf_counter() - start, "validation")
+            return await run_in_threadpool(serve_recommend, ticket, request.state.tier, start,
+                                           request.state.arrival)
+
+        def serve_recommend(ticket, tier, start, arrival):
+            try:
+                kb = self.get_kb(ticket.kb)  # loads the KB on first use
+            except KeyError:
+                raise HTTPException(status_code=404, detail=f"Unknown knowledge base '{ticket.kb}'. "
+                                                            f"Available: {self.registry.names()}")
+            if ticket.filters:
+                try:
+                    kb.filter_mask(ticket.filters)
+                except ValueError as e:
+                    raise HTTPException(status_code=422, detail=str(e))
+
+            key = memo_key(kb.name, kb.index_version, ticket.ticket_text, ticket.filters) if self.shedder else None
+            if tier == "memo_only":
+                recommendations = self.shedder.recall(key)
+                if recommendations is not None:
+                    result = {"ticket_id": ticket.ticket_id, "ticket_text": ticket.ticket_text,
+                              "kb": kb.name, "tier": tier, "recommendations": recommendations}
+                    self._log_impression(ticket.ticket_id, ticket.ticket_text, kb, recommendations, tier)
+                else:
+                    # Frequent texts can still be answered from the intent table
+                    hit = self._intent_candidates(ticket.ticket_text, kb, self.top_k, ticket.filters)
+                    if hit is None:
+                        raise self._shed(tier)
+                    candidates, relevance, reranked = hit
+                    result = self._build_response(ticket.ticket_id, ticket.ticket_text, candidates,
+                                                  start, kb, tier, relevance, reranked)
+            else:
+                result = self.recommend(ticket.ticket_id, ticket.ticket_text, kb=ticket.kb,
+                                        filters=ticket.filters, tier=tier)
+                if self.shedder:
+                    # Measured from arrival, so time spent queued raises the tier too
+                    self.shedder.observe(time.perf_counter() - arrival)
+                    if tier == "normal":
+                        self.shedder.remember(key, result["recommendations"])
+
+            with self.stage("serialization"):
+                return Response(content=json.dumps(result), media_type="application/json")
+
+        @self.app.post("/feedback")
+        def feedback(feedback: Feedback):
+            # A click on a recommended article, used for CTR alerting
+            self.log_event({"event": "click", "ticket_id": feedback.ticket_id,
+                            "article_title": feedback.article_title})
+            return {"status": "ok"}
+
+        @self.app.get("/metrics")
+        def metrics():
+            return Response(content=self.render_metrics(), media_type="text/plain; version=0.0.4")
+
+        @self.app.get("/stats")
+        def stats():
+            return {
+                "rerank": self.reranker.get_stats() if self.reranker else None,
+                "kbs": self.registry.stats(),
+                "load_shedding": self.shedder.stats() if self.shedder else None,
+            }
 
     def get_app(self):
         return self.app
 
 
-# Export the FastAPI app instance for uvicorn
-api = RecommendationAPI(model_dir="models", log_dir="logs", top_k=3)
-app = api.get_app()
-
+def create_app(model_dir="models", log_dir="logs", top_k=3, **kwargs):
+    """
+    App factory for uvicorn: `uvicorn src.recommend_api:create_app --factory`.
+    Models and indexes are loaded here, not when the module is imported.
+    """
+    return RecommendationAPI(model_dir=model_dir, log_dir=log_dir, top_k=top_k, **kwargs).get_app()
 
 
+def __getattr__(name):
+    # Keep `src.recommend_api:app` working, built on first access instead of at import
+    if name == "app":
+        global app
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
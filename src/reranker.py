@@ -0,0 +1,88 @@
+import time
+import threading
+from sentence_transformers import CrossEncoder
+
+
+class CrossEncoderReranker:
+    """
+    Re-scores first-stage candidates with a local cross-encoder.
+
+    All (query, article) pairs of a request are scored in one batched
+    forward pass. A per-request latency budget decides whether reranking
+    runs at all and how many candidates it may cover: the per-pair cost is
+    tracked as a moving average and the candidate list is truncated to what
+    fits in the remaining budget.
+    """
+
+    def __init__(self, model_name="cross-encoder/ms-marco-MiniLM-L-6-v2", max_length=256, smoothing=0.2):
+        self.model_name = model_name
+        self.model = CrossEncoder(model_name, max_length=max_length)
+        self.smoothing = smoothing
+        self.pair_ms = None
+        self._lock = threading.Lock()
+        self.stats = {
+            "requests": 0,
+            "reranked": 0,
+            "truncated": 0,
+            "skipped": 0,
+            "added_ms_total": 0.0,
+        }
+
+    def _affordable_pairs(self, remaining_ms, num_candidates):
+        if remaining_ms is None:
+            return num_candidates
+        if remaining_ms <= 0:
+            return 0
+        if self.pair_ms is None:
+            return num_candidates
+        return min(num_candidates, int(remaining_ms / max(self.pair_ms, 1e-6)))
+
+    def rerank(self, query, candidates, passages, remaining_ms, min_pairs=2):
+        """
+        Rerank candidates within the remaining latency budget.
+
+        candidates is a list of (article_idx, score) and passages the
+        matching article texts. Candidates that do not fit in the budget
+        keep their first-stage order and scores after the reranked ones.
+        remaining_ms None reranks every candidate.
+        Returns the candidates and how many of them, from the front, carry
+        cross-encoder scores (0 if reranking was skipped).
+        """
+        with self._lock:
+            self.stats["requests"] += 1
+            n = self._affordable_pairs(remaining_ms, len(candidates))
+
+        if n < min(min_pairs, len(candidates)) or not candidates:
+            with self._lock:
+                self.stats["skipped"] += 1
+            return candidates, 0
+
+        start = time.perf_counter()
+        scores = self.model.predict([(query, passage) for passage in passages[:n]])
+        added_ms = (time.perf_counter() - start) * 1000
+
+        head = sorted(
+            ((idx, float(score)) for (idx, _), score in zip(candidates[:n], scores)),
+            key=lambda item: item[1],
+            reverse=True,
+        )
+
+        with self._lock:
+            per_pair = added_ms / n
+            if self.pair_ms is None:
+                self.pair_ms = per_pair
+            else:
+                self.pair_ms = (1 - self.smoothing) * self.pair_ms + self.smoothing * per_pair
+            self.stats["reranked"] += 1
+            self.stats["truncated"] += int(n < len(candidates))
+            self.stats["added_ms_total"] += added_ms
+
+        return head + list(candidates[n:]), n
+
+    def get_stats(self):
+        """Return rerank hit rate and average added latency."""
+        with self._lock:
+            stats = dict(self.stats)
+        stats["hit_rate"] = stats["reranked"] / stats["requests"] if stats["requests"] else 0.0
+        stats["avg_added_ms"] = stats["added_ms_total"] / stats["reranked"] if stats["reranked"] else 0.0
+        return stats
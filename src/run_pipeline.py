@@ -0,0 +1,122 @@
+import os
+import argparse
+from integrations.gsheet_loader import GoogleSheetLoader
+from src.preprocessing2 import TicketProcessor
+from src.classification_tagging import TicketClassifier
+from src.build_index import KnowledgeBaseIndexer
+from src.intent_table import rebuild_intent_tables, add_serving_args, serving_kwargs
+from src.gap_analysis import RecommendationAnalyzer
+from src.profiling import PipelineProfiler
+
+
+class OfflinePipeline:
+    """
+    Runs the nightly offline path with per-stage instrumentation:
+    sheet load -> preprocessing -> classification -> indexing -> intent tables
+    -> gap analysis. serving_config holds the RecommendationAPI settings
+    the intent tables are built with (see intent_table.SERVING_ARGS); they
+    have to match the serving API's or it ignores the tables.
+    """
+
+    def __init__(self,
+                 sheet_name="tickets1",
+                 worksheet_name="Sheet1",
+                 creds_path="credentials/service_account.json",
+                 raw_path="data/raw/tickets6.csv",
+                 preprocessed_path="data/processed/preprocessed_tickets6.parquet",
+                 classified_path="data/processed/classified_tickets6.parquet",
+                 recommendation_log_path="logs/recommendation_results5.parquet",
+                 request_log_path="logs/recommendations.jsonl",
+                 profiler=None,
+                 rate_limit=1,
+                 incremental=False,
+                 serving_config=None):
+        self.sheet_name = sheet_name
+        self.worksheet_name = worksheet_name
+        self.creds_path = creds_path
+        self.raw_path = raw_path
+        self.preprocessed_path = preprocessed_path
+        self.classified_path = classified_path
+        self.recommendation_log_path = recommendation_log_path
+        self.request_log_path = request_log_path
+        self.profiler = profiler or PipelineProfiler()
+        self.rate_limit = rate_limit
+        self.incremental = incremental
+        self.serving_config = serving_config or {}
+
+    def load_tickets(self):
+        loader = GoogleSheetLoader(self.sheet_name, self.worksheet_name, self.creds_path)
+        # Incremental mode fetches only rows appended since the last run
+        load = loader.load_incremental if self.incremental else loader.load_data
+        df = self.profiler.wrap("load_sheet", load, rows=len)
+        os.makedirs(os.path.dirname(self.raw_path), exist_ok=True)
+        df.to_csv(self.raw_path, index=False)
+        return df
+
+    def preprocess(self, df):
+        with self.profiler.stage("preprocess", rows=len(df)):
+            os.makedirs(os.path.dirname(self.preprocessed_path), exist_ok=True)
+            TicketProcessor(df=df, output_file=self.preprocessed_path).process_and_save()
+
+    def classify(self):
+        with self.profiler.stage("classify") as record:
+            classifier = TicketClassifier()
+            classifier.load_tickets(self.preprocessed_path)
+            record["rows"] = len(classifier.tickets)
+            classifier.classify_all(classifier.ticket_ids, classifier.tickets, rate_limit=self.rate_limit)
+            classifier.save_results(self.classified_path)
+
+    def build_index(self):
+        with self.profiler.stage("build_index") as record:
+            indexer = KnowledgeBaseIndexer()
+            indexer.run_full_pipeline()
+            record["rows"] = len(indexer.articles)
+
+    def build_intent_tables(self):
+        # The new index version invalidates the old tables, so rebuild them from the request log
+        with self.profiler.stage("intent_table") as record:
+            record["rows"] = len(rebuild_intent_tables(model_dir="models", log_path=self.request_log_path,
+                                                         **self.serving_config))
+
+    def analyze(self):
+        with self.profiler.stage("gap_analysis") as record:
+            analyzer = RecommendationAnalyzer(log_path=self.recommendation_log_path, output_dir="logs")
+            results = analyzer.run_full_analysis()
+            record["rows"] = len(analyzer.logs_df)
+        return results
+
+    def run(self, skip=()):
+        try:
+            if "load_sheet" not in skip:
+                df = self.load_tickets()
+            else:
+                df = TicketProcessor(input_file=self.raw_path).df
+            if df.empty:
+                print("No new tickets to process.")
+                skip = set(skip) | {"preprocess", "classify"}
+            if "preprocess" not in skip:
+                self.preprocess(df)
+            if "classify" not in skip:
+                self.classify()
+            if "build_index" not in skip:
+                self.build_index()
+            if "intent_table" not in skip:
+                self.build_intent_tables()
+            if "gap_analysis" not in skip:
+                self.analyze()
+        finally:
+            self.profiler.save_report()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the offline pipeline with profiling.")
+    parser.add_argument("--profile-stage", default=None,
+                        help="Capture a cProfile dump for this stage (load_sheet, preprocess, classify, build_index, intent_table, gap_analysis).")
+    parser.add_argument("--skip", nargs="*", default=[], help="Stages to skip.")
+    parser.add_argument("--incremental", action="store_true", help="Only ingest sheet rows added since the last run.")
+    add_serving_args(parser)  # settings of the serving API, for the intent tables
+    args = parser.parse_args()
+
+    pipeline = OfflinePipeline(profiler=PipelineProfiler(profile_stage=args.profile_stage),
+                               incremental=args.incremental, serving_config=serving_kwargs(args))
+    pipeline.run(skip=set(args.skip))
@@ -2,7 +2,8 @@ import uvicorn
 
 if __name__ == "__main__":
     uvicorn.run(
-        "recommend_api:app",  # module_name:variable_name
+        "src.recommend_api:create_app",  # module_name:factory_name
+        factory=True,  # build the app (and load models) in the server process
         host="127.0.0.1",
         port=8000,
         reload=True   # enables auto-reload when you change code
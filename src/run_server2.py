@@ -4,7 +4,8 @@ class UvicornServer:
     @staticmethod
     def run():
          uvicorn.run(
-            "recommend_api:app",  # module_name:variable_name
+            "src.recommend_api:create_app",  # module_name:factory_name
+            factory=True,
             host="127.0.0.1",
             port=8000,
             reload=True   # enables auto-reload when you change code
@@ -13,4 +14,3 @@ class UvicornServer:
 if __name__ == "__main__":
     server = UvicornServer()
     server.run()
-
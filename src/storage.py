@@ -0,0 +1,188 @@
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+RECOMMENDATION = pa.struct([
+    ("rank", pa.int32()),
+    ("article_title", pa.string()),
+    ("score", pa.float32()),
+    ("scorer", pa.string()),
+])
+
+# Typed columns of each pipeline table. Columns not listed here are stored
+# with the type pyarrow infers from the DataFrame.
+SCHEMAS = {
+    "preprocessed": {
+        "ticket_id": pa.string(),
+        "ticket_text": pa.string(),
+        "clean_text": pa.string(),
+    },
+    "classified": {
+        "ticket_id": pa.string(),
+        "ticket_text": pa.string(),
+        "pred_category": pa.string(),
+        "tags": pa.list_(pa.string()),
+        "confidence": pa.float64(),
+        "error": pa.string(),
+    },
+    "recommendations": {
+        "ticket_id": pa.string(),
+        "ticket_text": pa.string(),
+        "recommendations": pa.list_(RECOMMENDATION),
+        "error": pa.string(),
+    },
+    "coverage": {
+        "article": pa.string(),
+        "impressions": pa.int64(),
+        "avg_score": pa.float64(),
+        "clicks": pa.int64(),
+        "CTR": pa.float64(),
+    },
+}
+# One row per ticket after preprocessing, classification and recommendation
+SCHEMAS["pipeline"] = {**SCHEMAS["preprocessed"], **SCHEMAS["classified"], **SCHEMAS["recommendations"]}
+
+
+def is_parquet(path):
+    return str(path).endswith(".parquet")
+
+
+def _column_array(values, field_type):
+    if pa.types.is_list(field_type) or pa.types.is_struct(field_type):
+        # Nested values stay Python lists/dicts; anything else (NaN, error rows) is null
+        values = [v if isinstance(v, (list, tuple, dict)) else None for v in values]
+        return pa.array(values, type=field_type)
+    if pa.types.is_string(field_type):
+        values = [None if pd.isna(v) else str(v) for v in values]
+        return pa.array(values, type=field_type)
+    return pa.array(values, type=field_type, from_pandas=True)
+
+
+def to_arrow(df, schema=None):
+    """Convert a DataFrame to an Arrow table, applying a named schema."""
+    typed = SCHEMAS.get(schema, {}) if isinstance(schema, str) else (schema or {})
+    arrays, names = [], []
+    for column in df.columns:
+        values = df[column]
+        if column in typed:
+            arrays.append(_column_array(values.tolist(), typed[column]))
+        else:
+            arrays.append(pa.Array.from_pandas(values))
+        names.append(str(column))
+    return pa.Table.from_arrays(arrays, names=names)
+
+
+def write_table(df, path, schema=None, compression="zstd"):
+    """
+    Write a pipeline table. .parquet paths are written as typed Parquet
+    (list and struct columns kept nested); other paths as CSV.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if is_parquet(path):
+        pq.write_table(to_arrow(df, schema), path, compression=compression)
+    else:
+        df.to_csv(path, index=False)
+    return path
+
+
+def table_columns(path):
+    """Column names of a stored table, without reading its data."""
+    if is_parquet(path):
+        return pq.read_schema(path).names
+    return pd.read_csv(path, nrows=0).columns.tolist()
+
+
+def read_table(path, columns=None, filters=None):
+    """
+    Read a pipeline table. For Parquet only the requested columns (and
+    row groups matching filters) are read from disk.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"File '{path}' not found.")
+    if is_parquet(path):
+        return pq.read_table(path, columns=columns, filters=filters).to_pandas()
+    return pd.read_csv(path, usecols=columns)
+
+
+def iter_table(path, batch_rows=1000, columns=None):
+    """Yield a stored table as DataFrames of at most batch_rows rows."""
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"File '{path}' not found.")
+    if is_parquet(path):
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_rows, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, usecols=columns, chunksize=batch_rows)
+
+
+class TableWriter:
+    """
+    Append DataFrame batches to a single table file: one row group per
+    batch for Parquet, appended rows for CSV. The columns are fixed by the
+    first batch plus the named schema; columns missing from a later batch
+    are written as nulls.
+    """
+
+    def __init__(self, path, schema=None, compression="zstd"):
+        self.path = path
+        self.typed = SCHEMAS.get(schema, {}) if isinstance(schema, str) else (schema or {})
+        self.compression = compression
+        self.columns = None
+        self.rows = 0
+        self._arrow_schema = None
+        self._writer = None
+
+    def _start(self, df):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.columns = [str(c) for c in df.columns] + [c for c in self.typed if c not in df.columns]
+        if not is_parquet(self.path):
+            return
+        fields = []
+        for column in self.columns:
+            if column in self.typed:
+                field_type = self.typed[column]
+            else:
+                field_type = pa.Array.from_pandas(df[column]).type
+                if pa.types.is_null(field_type):
+                    field_type = pa.string()
+            fields.append(pa.field(column, field_type))
+        self._arrow_schema = pa.schema(fields)
+        self._writer = pq.ParquetWriter(self.path, self._arrow_schema, compression=self.compression)
+
+    def write(self, df):
+        if self.columns is None:
+            self._start(df)
+        if self._writer is not None:
+            arrays = [
+                _column_array(df[f.name].tolist(), f.type) if f.name in df.columns else pa.nulls(len(df), type=f.type)
+                for f in self._arrow_schema
+            ]
+            self._writer.write_table(pa.Table.from_arrays(arrays, schema=self._arrow_schema))
+        else:
+            df.reindex(columns=self.columns).to_csv(self.path, mode="w" if self.rows == 0 else "a",
+                                                     header=self.rows == 0, index=False)
+        self.rows += len(df)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def to_python(value):
+    """Convert nested values read back from Parquet (numpy arrays) to lists/dicts."""
+    if hasattr(value, "tolist") and not isinstance(value, (str, bytes)):
+        value = value.tolist()
+    if isinstance(value, list):
+        return [to_python(v) for v in value]
+    if isinstance(value, dict):
+        return {k: to_python(v) for k, v in value.items()}
+    return value
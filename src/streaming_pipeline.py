@@ -0,0 +1,430 @@
+import os
+import json
+import time
+import queue
+import argparse
+import threading
+import pandas as pd
+from src.preprocessing2 import TicketProcessor
+from src.storage import TableWriter, iter_table
+
+_DONE = object()  # end-of-stream marker passed down the queues
+
+
+class Stage:
+    """
+    One step of the streaming pipeline: func takes a DataFrame batch and
+    returns the batch for the next stage (or None/empty to drop it).
+    With workers > 1 the function must be thread safe.
+    """
+
+    def __init__(self, name, func, workers=1):
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.lock = threading.Lock()
+        self.active = workers
+        self.stats = {
+            "batches": 0, "rows_in": 0, "rows_out": 0,
+            "busy_s": 0.0,      # time spent in func
+            "starved_s": 0.0,   # time waiting for input
+            "blocked_s": 0.0,   # time waiting for room downstream (backpressure)
+            "queue_depth_sum": 0, "queue_depth_max": 0,
+        }
+
+    def record(self, **values):
+        with self.lock:
+            for key, value in values.items():
+                if key == "queue_depth":
+                    self.stats["queue_depth_sum"] += value
+                    self.stats["queue_depth_max"] = max(self.stats["queue_depth_max"], value)
+                else:
+                    self.stats[key] += value
+
+
+class StreamingPipeline:
+    """
+    Runs pipeline stages concurrently, each in its own thread(s), connected
+    by bounded queues. A stage that falls behind fills its input queue and
+    blocks the stages upstream, so at most queue_size batches wait between
+    any two stages and memory stays bounded however large the input is.
+
+    The source (an iterable of DataFrames) is consumed by an "ingest" thread,
+    so reading overlaps with preprocessing, classification and recommendation.
+    run(source, on_done) calls on_done(i) once the i-th source batch has
+    been through the last stage or was dropped on the way, e.g. to commit
+    a source watermark only after the sink has written the rows.
+    """
+
+    def __init__(self, stages, queue_size=4, report_interval=10.0,
+                 run_name="streaming_pipeline", report_dir="logs/run_reports"):
+        self.stages = stages
+        self.queue_size = queue_size
+        self.report_interval = report_interval
+        self.run_name = run_name
+        self.report_dir = report_dir
+        self.queues = []
+        self.error = None
+        self.wall_s = None
+        self._ingest_stage = None
+        self._on_done = None
+        self._stop = threading.Event()
+
+    def _put(self, q, item, stage):
+        start = time.perf_counter()
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                stage.record(blocked_s=time.perf_counter() - start)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q, stage):
+        start = time.perf_counter()
+        while not self._stop.is_set():
+            try:
+                item = q.get(timeout=0.1)
+                stage.record(starved_s=time.perf_counter() - start, queue_depth=q.qsize())
+                return item
+            except queue.Empty:
+                continue
+        return None
+
+    def _fail(self, stage, e):
+        if self.error is None:
+            self.error = e
+            print(f"[{stage.name}] failed: {e}")
+        self._stop.set()
+
+    def _ingest(self, source, stage, out_q):
+        try:
+            iterator = iter(source)
+            seq = 0
+            while not self._stop.is_set():
+                start = time.perf_counter()
+                batch = next(iterator, None)
+                stage.record(busy_s=time.perf_counter() - start)
+                if batch is None:
+                    break
+                stage.record(batches=1, rows_in=len(batch), rows_out=len(batch))
+                # Batches travel with their source position, reported to on_done when they finish
+                if not self._put(out_q, (seq, batch), stage):
+                    return
+                seq += 1
+            self._put(out_q, _DONE, stage)
+        except Exception as e:
+            self._fail(stage, e)
+
+    def _work(self, stage, in_q, out_q):
+        try:
+            while True:
+                item = self._get(in_q, stage)
+                if item is None:
+                    return
+                if item is _DONE:
+                    in_q.put(_DONE)  # let sibling workers see the end of stream too
+                    with stage.lock:
+                        stage.active -= 1
+                        last = stage.active == 0
+                    if last and out_q is not None:
+                        self._put(out_q, _DONE, stage)
+                    return
+
+                seq, batch = item
+                start = time.perf_counter()
+                result = stage.func(batch)
+                rows_out = 0 if result is None else len(result)
+                stage.record(batches=1, rows_in=len(batch), rows_out=rows_out,
+                             busy_s=time.perf_counter() - start)
+                if out_q is not None and rows_out:
+                    if not self._put(out_q, (seq, result), stage):
+                        return
+                elif self._on_done is not None:
+                    self._on_done(seq)
+        except Exception as e:
+            self._fail(stage, e)
+
+    def _monitor(self, ingest):
+        while not self._stop.wait(self.report_interval):
+            parts = [f"ingest {ingest.stats['rows_out']}"]
+            for stage, q in zip(self.stages, self.queues):
+                parts.append(f"{stage.name} {stage.stats['rows_out']} (queue {q.qsize()}/{self.queue_size})")
+            print("[stream] " + " | ".join(parts))
+
+    def run(self, source, on_done=None):
+        """Push every batch of source through the stages. Returns the run report."""
+        ingest = self._ingest_stage = Stage("ingest", None)
+        self._on_done = on_done
+        self.queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        self.error = None
+        self._stop.clear()
+
+        threads = [threading.Thread(target=self._ingest, args=(source, ingest, self.queues[0]),
+                                    name="ingest", daemon=True)]
+        for i, stage in enumerate(self.stages):
+            out_q = self.queues[i + 1] if i + 1 < len(self.stages) else None
+            stage.active = stage.workers
+            for w in range(stage.workers):
+                threads.append(threading.Thread(target=self._work, args=(stage, self.queues[i], out_q),
+                                                name=f"{stage.name}-{w}", daemon=True))
+
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        monitor = threading.Thread(target=self._monitor, args=(ingest,), daemon=True)
+        monitor.start()
+        for thread in threads:
+            thread.join()
+        self._stop.set()
+        self.wall_s = time.perf_counter() - start
+
+        report = self.report()
+        for s in report["stages"]:
+            print(f"[{s['stage']}] {s['rows_out']} rows, {s['rows_per_s']:.1f} rows/s, "
+                  f"utilization {s['utilization']:.0%}, avg queue {s['avg_queue_depth']:.1f}")
+        if self.error is not None:
+            raise self.error
+        return report
+
+    def report(self):
+        stages = []
+        for stage in [self._ingest_stage] + self.stages:
+            stats = dict(stage.stats)
+            depth_sum = stats.pop("queue_depth_sum")
+            stats.update({
+                "stage": stage.name,
+                "workers": stage.workers,
+                "rows_per_s": stats["rows_out"] / self.wall_s if self.wall_s else 0.0,
+                "utilization": stats["busy_s"] / (self.wall_s * stage.workers) if self.wall_s else 0.0,
+                "avg_queue_depth": depth_sum / stats["batches"] if stats["batches"] and stage.func else 0.0,
+            })
+            stages.append(stats)
+        return {
+            "run": self.run_name,
+            "pid": os.getpid(),
+            "queue_size": self.queue_size,
+            "total_wall_s": self.wall_s,
+            "status": "ok" if self.error is None else "error",
+            "stages": stages,
+        }
+
+    def save_report(self, report=None):
+        os.makedirs(self.report_dir, exist_ok=True)
+        path = os.path.join(self.report_dir, f"{self.run_name}_{time.strftime('%Y%m%d-%H%M%S')}.json")
+        with open(path, "w") as f:
+            json.dump(report or self.report(), f, indent=2, default=str)
+        print(f"Run report saved to: {path}")
+        return path
+
+
+# STAGE FUNCTIONS
+
+def preprocess(batch):
+    return TicketProcessor(df=batch).process()
+
+
+class Deduplicator:
+    """Drops tickets whose ticket_id was already seen earlier in the stream."""
+
+    def __init__(self, key_column="ticket_id"):
+        self.key_column = key_column
+        self.seen = set()
+        self.lock = threading.Lock()
+
+    def __call__(self, batch):
+        keys = batch[self.key_column].astype(str)
+        with self.lock:
+            keep = [k not in self.seen for k in keys]
+            self.seen.update(keys)
+        batch = batch[keep]
+        return batch[~batch[self.key_column].astype(str).duplicated()]
+
+
+class ClassifyStage:
+    """
+    Classifies each ticket with TicketClassifier. Tickets whose clean_text
+    was already classified reuse that result instead of calling the LLM again.
+    """
+
+    def __init__(self, classifier, rate_limit=1):
+        self.classifier = classifier
+        self.rate_limit = rate_limit
+        self.memo = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, batch):
+        results = []
+        for ticket_id, text in zip(batch["ticket_id"], batch["clean_text"]):
+            # The LLM call runs outside the lock so workers > 1 still classify concurrently
+            with self.lock:
+                result = self.memo.get(text)
+            if result is None:
+                result = self.classifier.classify_ticket(ticket_id, text)
+                with self.lock:
+                    self.memo[text] = result
+                time.sleep(self.rate_limit)
+            results.append({k: result.get(k) for k in ("pred_category", "tags", "confidence", "error")})
+        return batch.assign(**pd.DataFrame(results, index=batch.index))
+
+
+class RecommendStage:
+    """
+    Adds recommendations to each ticket, in-process through a
+    RecommendationAPI engine (one batched encode + search per batch) or
+    over HTTP through a RecommendationClient. With filter_category, only
+    articles of the ticket's predicted category are recommended.
+    """
+
+    def __init__(self, engine=None, client=None, filter_category=False):
+        if (engine is None) == (client is None):
+            raise ValueError("Pass exactly one of 'engine' or 'client'.")
+        self.engine = engine
+        self.client = client
+        self.filter_category = filter_category
+
+    def __call__(self, batch):
+        columns = [c for c in ("ticket_id", "ticket_text", "kb") if c in batch.columns]
+        tickets = batch[columns].to_dict(orient="records")
+        filterable = self.engine is None or "category" in self.engine.default_kb.filter_ids
+        if self.filter_category and filterable and "pred_category" in batch.columns:
+            for ticket, category in zip(tickets, batch["pred_category"]):
+                if isinstance(category, str) and category:
+                    ticket["filters"] = {"category": category}
+        if self.engine is not None:
+            responses = self.engine.recommend_batch(tickets)
+        else:
+            responses = [None] * len(tickets)
+            for i, result in self.client.iter_results(tickets):
+                responses[i] = result
+
+        batch = batch.copy()
+        batch["recommendations"] = [r.get("recommendations") for r in responses]
+        errors = [r.get("error") for r in responses]
+        if any(e is not None for e in errors):
+            previous = batch["error"] if "error" in batch.columns else pd.Series([None] * len(batch), index=batch.index)
+            batch["error"] = [e if e is not None else p for e, p in zip(errors, previous)]
+        return batch
+
+
+class TableSink:
+    """Appends each batch to one output table (Parquet or CSV)."""
+
+    def __init__(self, path, schema="pipeline"):
+        self.writer = TableWriter(path, schema=schema)
+        self.lock = threading.Lock()
+
+    def __call__(self, batch):
+        with self.lock:
+            self.writer.write(batch)
+        return batch
+
+    def close(self):
+        self.writer.close()
+
+
+def build_stages(output_path, classifier=None, engine=None, client=None,
+                 rate_limit=1, classify_workers=1, filter_category=False):
+    """
+    ingest -> preprocess -> dedup -> classify -> recommend -> write.
+    Classification is skipped without a classifier, recommendation
+    without an engine or client.
+    """
+    sink = TableSink(output_path)
+    stages = [Stage("preprocess", preprocess), Stage("dedup", Deduplicator())]
+    if classifier is not None:
+        stages.append(Stage("classify", ClassifyStage(classifier, rate_limit), workers=classify_workers))
+    if engine is not None or client is not None:
+        stages.append(Stage("recommend", RecommendStage(engine=engine, client=client,
+                                                        filter_category=filter_category)))
+    stages.append(Stage("write", sink))
+    return stages, sink
+
+
+class SheetSource:
+    """
+    New sheet rows, fetched incrementally and yielded in batches. Rows are
+    fetched one batchGet page at a time, so at most one page is in memory
+    ahead of the pipeline's queues.
+
+    Pass done as StreamingPipeline.run's on_done: a page's watermark is
+    committed (rows added to the raw store, ingest state saved) only once
+    all its batches, and every batch before them, went through the sink
+    or were dropped. Rows of a run that fails downstream are fetched again
+    on the next run.
+    """
+
+    def __init__(self, loader, batch_rows=500):
+        self.loader = loader
+        self.batch_rows = batch_rows
+        self.lock = threading.Lock()
+        self.next_seq = 0        # lowest batch position not yet done
+        self.finished = set()    # done positions above next_seq
+        self.checkpoints = []    # (position of the page's last batch, checkpoint), in page order
+
+    def __iter__(self):
+        seq = 0
+        for page in self.loader.iter_incremental(commit=False):
+            batches = [page.iloc[offset:offset + self.batch_rows] for offset in range(0, len(page), self.batch_rows)]
+            with self.lock:
+                self.checkpoints.append((seq + len(batches) - 1, self.loader.checkpoint))
+            for batch in batches:
+                yield batch
+                seq += 1
+
+    def done(self, seq):
+        with self.lock:
+            self.finished.add(seq)
+            while self.next_seq in self.finished:
+                self.finished.remove(self.next_seq)
+                self.next_seq += 1
+            # Committed under the lock, so watermarks are saved in page order
+            while self.checkpoints and self.checkpoints[0][0] < self.next_seq:
+                self.loader.commit(self.checkpoints.pop(0)[1])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream tickets through preprocessing, classification and recommendation.")
+    parser.add_argument("--input", default="data/raw/tickets6.csv", help="Raw tickets (CSV or Parquet).")
+    parser.add_argument("--from-sheet", action="store_true", help="Ingest new rows from Google Sheets instead of --input.")
+    parser.add_argument("--output", default="data/processed/pipeline_tickets6.parquet")
+    parser.add_argument("--batch-rows", type=int, default=64)
+    parser.add_argument("--queue-size", type=int, default=4, help="Max batches waiting between two stages.")
+    parser.add_argument("--no-classify", action="store_true")
+    parser.add_argument("--classify-workers", type=int, default=1)
+    parser.add_argument("--rate-limit", type=float, default=1)
+    parser.add_argument("--api-url", default=None, help="Recommend over HTTP instead of in-process.")
+    parser.add_argument("--model-dir", default="models")
+    parser.add_argument("--no-recommend", action="store_true")
+    parser.add_argument("--filter-category", action="store_true",
+                        help="Only recommend articles in the ticket's predicted category.")
+    args = parser.parse_args()
+
+    classifier = engine = client = None
+    if not args.no_classify:
+        from src.classification_tagging import TicketClassifier
+        classifier = TicketClassifier()
+    if not args.no_recommend and args.api_url:
+        from src.test_request3 import RecommendationClient
+        client = RecommendationClient(api_url=args.api_url)
+    elif not args.no_recommend:
+        from src.recommend_api import RecommendationAPI
+        engine = RecommendationAPI(model_dir=args.model_dir, log_dir="logs")
+
+    if args.from_sheet:
+        from integrations.gsheet_loader import GoogleSheetLoader
+        source = SheetSource(GoogleSheetLoader("tickets1", "Sheet1", "credentials/service_account.json"), args.batch_rows)
+    else:
+        source = iter_table(args.input, batch_rows=args.batch_rows)
+
+    stages, sink = build_stages(args.output, classifier=classifier, engine=engine, client=client,
+                                rate_limit=args.rate_limit, classify_workers=args.classify_workers,
+                                filter_category=args.filter_category)
+    pipeline = StreamingPipeline(stages, queue_size=args.queue_size)
+    try:
+        report = pipeline.run(source, on_done=source.done if args.from_sheet else None)
+    finally:
+        sink.close()
+    pipeline.save_report(report)
+    print(f"Results saved to '{args.output}'.")
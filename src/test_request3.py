@@ -1,33 +1,86 @@
 import json
 import requests
 import pandas as pd
-from typing import List, Dict
+from typing import List, Dict, Iterable, Iterator, Tuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from src.storage import write_table
 
 
 class RecommendationClient:
     """
     A client for interacting with the RecommendationAPI service.
-    
+
     Sends support tickets to the FastAPI endpoint and retrieves
     the recommended knowledge base articles.
+
+    Requests go through one pooled keep-alive session with retries
+    (exponential backoff on 5xx responses, connection errors and read
+    timeouts). Batches are sent with up to max_workers requests in flight.
     """
 
-    def __init__(self, api_url: str = "http://127.0.0.1:8000/recommend"):
+    def __init__(self, api_url: str = "http://127.0.0.1:8000/recommend",
+                 max_workers: int = 8, timeout: float = 10,
+                 max_retries: int = 3, backoff_factor: float = 0.5):
         self.api_url = api_url
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.session = self._build_session(max_retries, backoff_factor)
+
+    def _build_session(self, max_retries: int, backoff_factor: float) -> requests.Session:
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(500, 502, 503, 504),
+            allowed_methods=frozenset(["GET", "POST"]),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(self.max_workers, 1), max_retries=retry)
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
 
     # Core request method
     def send_ticket(self, ticket: Dict) -> Dict:
         # Sends a single ticket to the API and returns JSON response.
         try:
-            response = requests.post(self.api_url, json=ticket, timeout=10)
+            response = self.session.post(self.api_url, json=ticket, timeout=self.timeout)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
             print(f"Error sending ticket {ticket.get('ticket_id')}: {e}")
             return {"ticket_id": ticket.get("ticket_id"), "error": str(e)}
 
+    def iter_results(self, tickets: Iterable[Dict]) -> Iterator[Tuple[int, Dict]]:
+        """
+        Send tickets concurrently and yield (position, result) pairs as
+        responses arrive. At most 2 * max_workers tickets are queued at a
+        time, so large inputs are not all buffered in memory.
+        """
+        if self.max_workers <= 1:
+            for i, ticket in enumerate(tickets):
+                yield i, self.send_ticket(ticket)
+            return
+
+        window = 2 * self.max_workers
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            pending = {}
+            for i, ticket in enumerate(tickets):
+                pending[pool.submit(self.send_ticket, ticket)] = i
+                if len(pending) >= window:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield pending.pop(future), future.result()
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield pending.pop(future), future.result()
+
     # Batch processing
-    def process_tickets(self, csv_path: str) -> List[Dict]:
+    def process_tickets(self, csv_path: str, stream_path: str = None, verbose: bool = True) -> List[Dict]:
         try:
             df = pd.read_csv(csv_path)
         except FileNotFoundError:
@@ -36,21 +89,30 @@ class RecommendationClient:
         tickets = df.to_dict(orient="records")
         print(f"Loaded {len(tickets)} tickets from {csv_path}\n")
 
-        all_results = []
-        for ticket in tickets:
-            result = self.send_ticket(ticket)
-            all_results.append(result)
+        # Results are appended to stream_path (JSON lines) as they arrive
+        stream = open(stream_path, "w") if stream_path else None
+        all_results = [None] * len(tickets)
+        try:
+            for i, result in self.iter_results(tickets):
+                all_results[i] = result
+                if stream:
+                    stream.write(json.dumps(result) + "\n")
+                    stream.flush()
 
-            # Pretty print each result
-            print(json.dumps(result, indent=2))
-            print("-" * 50)
+                # Pretty print each result
+                if verbose:
+                    print(json.dumps(result, indent=2))
+                    print("-" * 50)
+        finally:
+            if stream:
+                stream.close()
 
         return all_results
 
     # Save results
     def save_results(self, results: List[Dict], output_path: str):
-        if output_path.endswith(".csv"):
-            pd.DataFrame(results).to_csv(output_path, index=False)
+        if output_path.endswith((".csv", ".parquet")):
+            write_table(pd.DataFrame(results), output_path, schema="recommendations")
         else:
             with open(output_path, "w") as f:
                 json.dump(results, f, indent=2)
@@ -60,7 +122,7 @@ class RecommendationClient:
 
 # Example Run
 if __name__ == "__main__":
-    client = RecommendationClient(api_url="http://127.0.0.1:8000/recommend")
+    client = RecommendationClient(api_url="http://127.0.0.1:8000/recommend", max_workers=8)
 
-    results = client.process_tickets("data/raw/tickets5.csv")
-    client.save_results(results, "logs/recommendation_results5.csv")
+    results = client.process_tickets("data/raw/tickets5.csv", stream_path="logs/recommendation_results5.jsonl")
+    client.save_results(results, "logs/recommendation_results5.parquet")